@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark of graphhopper points_encoded=false vs. points_encoded=true.
+
+Compares response size and client-side parse time (json decoding plus
+conversion of the route points to a numpy array). By default synthetic
+responses are used; with --url the same moves are queried from a running
+graphhopper (or hopper_standin.py) in both modes.
+
+    python bench_points_encoding.py --points 2000 --routes 200
+    python bench_points_encoding.py --url http://localhost:8989/route
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from route_geometry import encode_polyline, path_coordinates
+
+
+def synthetic_response(n_points, encoded, rng):
+    """ Response with a random walk of n_points [lon, lat, elevation]. """
+    coordinates = np.column_stack([
+        14.5 + np.cumsum(rng.normal(0, 2e-4, n_points)),
+        46.0 + np.cumsum(rng.normal(0, 2e-4, n_points)),
+        300 + np.cumsum(rng.normal(0, 0.5, n_points))])
+    coordinates = np.round(coordinates * [1e5, 1e5, 100]) / [1e5, 1e5, 100]
+
+    if encoded:
+        points = encode_polyline(coordinates)
+    else:
+        points = {"type": "LineString", "coordinates": coordinates.tolist()}
+    return json.dumps({"paths": [{"distance": 1.0, "time": 1, "points": points}]})
+
+
+def parse(bodies):
+    """ Seconds to decode all bodies down to numpy point arrays. """
+    start = time.perf_counter()
+    for body in bodies:
+        path_coordinates(json.loads(body)["paths"][0])
+    return time.perf_counter() - start
+
+
+def query(url, n_routes, encoded, rng):
+    """ Raw response bodies of n_routes random moves in Slovenia. """
+    import requests
+    from routing import route_parameters
+
+    session = requests.Session()
+    bodies = []
+    for _ in range(n_routes):
+        lat, lon = rng.uniform(45.5, 46.6, 2), rng.uniform(13.8, 16.3, 2)
+        parameters = route_parameters(f"{lat[0]},{lon[0]}", f"{lat[1]},{lon[1]}", encoded)
+        bodies.append(session.get(url, params=parameters).text)
+    return bodies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="graphhopper /route endpoint, synthetic responses if omitted")
+    parser.add_argument("--routes", type=int, default=200)
+    parser.add_argument("--points", type=int, default=2000, help="points per synthetic route")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<18}{'bytes/route':>14}{'parse ms/route':>16}")
+    for encoded in (False, True):
+        rng = np.random.default_rng(args.seed)  # Same moves in both modes.
+        if args.url:
+            bodies = query(args.url, args.routes, encoded, rng)
+        else:
+            bodies = [synthetic_response(args.points, encoded, rng) for _ in range(args.routes)]
+
+        size = np.mean([len(b.encode()) for b in bodies])
+        seconds = parse(bodies)
+        mode = "points_encoded=" + str(encoded).lower()
+        print(f"{mode:<18}{size:>14.0f}{1000 * seconds / len(bodies):>16.3f}")
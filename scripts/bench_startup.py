@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Startup time of the pipeline scripts.
+
+Every script is imported in a fresh interpreter with python -X importtime.
+The import time of the script is reported, including its own imports and
+excluding the interpreter start, along with the packages that take longest.
+Heavy dependencies (matplotlib, seaborn, scipy, uncertainties, ...) are
+imported where they are used, so a script should only pay for what it
+runs. The exit status is 1 if a script exceeds its budget:
+
+    python bench_startup.py
+    python bench_startup.py --budget 0.5 --log-dir ../data/derived/importtime
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+
+SCRIPTS = [
+    "pipeline", "preprocessing_1", "preprocessing_2", "migrations_fuel_calculations",
+    "model_of_travel_costs", "migrations_stats", "migrations_figures"]
+
+""" budgets [s] of scripts that need more than --budget """
+BUDGETS = {
+    "migrations_figures": 3.0,  # Draws, imports matplotlib and seaborn.
+}
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(log):
+    """ list of (self [s], cumulative [s], depth, module) of a -X importtime log. """
+    entries = []
+    for line in log.splitlines():
+        match = LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            entries.append((int(own) / 1e6, int(cumulative) / 1e6, (len(indent) - 1) // 2, module))
+    return entries
+
+
+def import_time(script, cwd=None):
+    """ Import time [s] of script in a fresh interpreter, the time per top
+    level package [s] and the raw log. """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + script],
+        cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError("Import of " + script + " failed:\n" + result.stderr[-2000:])
+
+    entries = parse_importtime(result.stderr)
+    total = next(cumulative for _, cumulative, depth, module in entries if depth == 0 and module == script)
+    packages = defaultdict(float)
+    for own, _, _, module in entries:
+        packages[module.split(".")[0]] += own
+    return total, dict(packages), result.stderr
+
+
+def bench(scripts, budget, repeat=3, log_dir=None):
+    """ Best of repeat import times of scripts.
+
+    :return: list of (script, seconds, budget, heaviest packages)
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for script in scripts:
+        runs = [import_time(script, here) for _ in range(repeat)]
+        total, packages, log = min(runs, key=lambda run: run[0])
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+            with open(os.path.join(log_dir, script + ".importtime.txt"), "w") as f:
+                f.write(log)
+        heaviest = sorted(((s, p) for p, s in packages.items() if p != script), reverse=True)[:3]
+        results.append((script, total, BUDGETS.get(script, budget), heaviest))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scripts", nargs="+", default=SCRIPTS, help="scripts to import, default all")
+    parser.add_argument("--budget", type=float, default=1.0, help="import time budget per script [s]")
+    parser.add_argument("--repeat", type=int, default=3, help="imports per script, the fastest counts")
+    parser.add_argument("--log-dir", help="directory of the raw -X importtime logs")
+    args = parser.parse_args()
+
+    results = bench(args.scripts, args.budget, args.repeat, args.log_dir)
+
+    print(f"{'script':<32}{'seconds':>10}{'budget':>10}  heaviest imports [s]")
+    over = []
+    for script, seconds, budget, heaviest in results:
+        print(f"{script:<32}{seconds:>10.3f}{budget:>10.2f}  " + ", ".join(f"{p} {s:.2f}" for s, p in heaviest))
+        if seconds > budget:
+            over.append(script)
+    if over:
+        print("Over budget: ", ", ".join(over))
+    sys.exit(1 if over else 0)
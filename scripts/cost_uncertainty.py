@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo distributions of migration costs.
+
+Every sample draws the parameters of the linear fuel consumption fit from
+their covariance (see fit_the_data in migrations_fuel_calculations.py) and,
+for every move, a relative error of the fuel price within its tariff period
+and of the routed distance. Fuel paid, toll and cost per hive moved per
+kilometer of all moves and samples are evaluated as arrays, a chunk of moves
+at a time, so memory stays at chunk_size * samples values per array:
+
+    fuel paid = (k * hives + intercept) * distance * price
+    toll      = toll rate * motorway kilometers (trucks, > 28 hives)
+
+with distance and motorway kilometers scaled by the distance error. Results
+are reproducible for a given seed and chunk_size.
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import numpy as np
+import pandas as pd
+
+
+QUANTITIES = ["fuel paid", "toll", "cost per hive moved", "cost per hive moved per kilometer"]
+YEARLY_QUANTITIES = ["fuel paid", "toll", "cost", "cost per hive moved per kilometer"]
+
+
+def draw_parameters(fit, samples, rng):
+    """ k and intercept of the linear fuel consumption fit, arrays of samples.
+
+    :param fit: row of fuel_calibration, with k_linear, intercept_linear and
+        their covariance var_k_lin, cov_k_intercept_lin, var_intercept_lin
+    """
+    mean = [fit.k_linear, fit.intercept_linear]
+    cov = [[fit.var_k_lin, fit.cov_k_intercept_lin], [fit.cov_k_intercept_lin, fit.var_intercept_lin]]
+    k, intercept = rng.multivariate_normal(mean, cov, size=samples).T
+    return k, intercept
+
+
+def quantile_columns(quantities, quantiles):
+    return [f"{quantity} q{q:g}" for quantity in quantities for q in quantiles]
+
+
+def simulate_costs(df, fit, samples=1000, price_cv=0.0, distance_cv=0.0, quantiles=(0.05, 0.5, 0.95),
+                   chunk_size=2000, seed=0, keys=("uuid", "uuid_migration", "year", "FAMILY_MOVE")):
+    """ Quantiles of the costs of every move and of every year.
+
+    :param df: moves with costs, see add_costs
+    :param fit: row of fuel_calibration, see draw_parameters
+    :param samples: number of Monte Carlo samples
+    :param price_cv: relative standard deviation of the fuel price within a
+        tariff period
+    :param distance_cv: relative standard deviation of routed distances
+    :param quantiles: quantiles reported, in [0, 1]
+    :param chunk_size: moves evaluated at once
+    :param seed: seed of the random generator
+    :param keys: columns of df copied to the per move quantiles
+    :return: per move quantiles aligned with df, and per year quantiles of the
+        total fuel paid, toll and cost and of the mean cost per hive moved per
+        kilometer; moves without a fuel price are left out of the yearly
+        figures, as pandas sums skip them
+    """
+    rng = np.random.default_rng(seed)
+    k, intercept = draw_parameters(fit, samples, rng)
+    quantiles = np.asarray(quantiles, dtype=float)
+
+    hives = df["FAMILY_MOVE"].values.astype(float)
+    distance = df["travel_distances"].values.astype(float)
+    price = df["Fuel price"].values.astype(float)
+    toll = (df["Euro 0 - 2"].values.astype(float) * df["motorway"].values.astype(float))
+    toll = np.nan_to_num(toll)  # No toll for cars, as in add_costs.
+
+    years, year_codes = np.unique(df["year"].values, return_inverse=True)
+    totals = {quantity: np.zeros((len(years), samples)) for quantity in YEARLY_QUANTITIES}
+    counts = np.zeros((len(years), samples))
+
+    per_move = np.full((len(df), len(QUANTITIES) * len(quantiles)), np.nan)
+    for start in range(0, len(df), chunk_size):
+        rows = slice(start, start + chunk_size)
+        n = len(hives[rows])
+
+        distance_factor = 1 + distance_cv * rng.standard_normal((n, samples))
+        price_factor = 1 + price_cv * rng.standard_normal((n, samples))
+
+        travelled = distance[rows, None] * distance_factor
+        consumption = hives[rows, None] * k + intercept
+        fuel_paid = consumption * travelled * price[rows, None] * price_factor
+        toll_paid = toll[rows, None] * distance_factor
+        cost = fuel_paid + toll_paid
+        per_hive = cost / hives[rows, None]
+        per_km = per_hive / travelled
+
+        values = {"fuel paid": fuel_paid, "toll": toll_paid, "cost per hive moved": per_hive,
+                  "cost per hive moved per kilometer": per_km}
+        per_move[rows] = np.concatenate(
+            [np.quantile(values[quantity], quantiles, axis=1).T for quantity in QUANTITIES], axis=1)
+
+        """ yearly sums of all samples at once, skipping moves without a price """
+        in_year = np.zeros((len(years), n))
+        in_year[year_codes[rows], np.arange(n)] = 1
+        valid = ~np.isnan(fuel_paid)
+        totals["fuel paid"] += in_year @ np.where(valid, fuel_paid, 0)
+        totals["toll"] += in_year @ toll_paid
+        totals["cost"] += in_year @ np.where(valid, cost, 0)
+        totals["cost per hive moved per kilometer"] += in_year @ np.where(valid, per_km, 0)
+        counts += in_year @ valid
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        totals["cost per hive moved per kilometer"] = totals["cost per hive moved per kilometer"] / counts
+
+    per_move = pd.DataFrame(per_move, index=df.index, columns=quantile_columns(QUANTITIES, quantiles))
+    per_move = pd.concat([df[[key for key in keys if key in df.columns]], per_move], axis=1)
+
+    per_year = pd.DataFrame(
+        np.concatenate([np.quantile(totals[quantity], quantiles, axis=1).T for quantity in YEARLY_QUANTITIES], axis=1),
+        index=pd.Index(years, name="year"), columns=quantile_columns(YEARLY_QUANTITIES, quantiles))
+
+    return per_move, per_year
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Registry of candidate models of fuel consumption versus number of colonies.
+
+Every model of utils.py in MODELS is fitted with curve_fit within its bounds,
+optionally in a pool of worker processes, and all fits are scored at once
+with R^2 and AIC. Fits are cached on disk (see partitions.PartitionStore),
+keyed by a fingerprint of the survey data, the model, the source of its
+function and its bounds, so reruns with the same survey and models skip
+refitting.
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import inspect
+import multiprocessing
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from partitions import PartitionStore, fingerprint
+from utils import linear, rise_exp2, decay_exp2, boltzman, sigmoid, r_squares, aic
+
+
+class FitModel:
+    """ A candidate model.
+
+    :param name: model name
+    :param func: function of x and the parameters, see utils.py
+    :param params: parameter names
+    :param bounds: (lower, upper) bounds of the parameters
+    """
+
+    def __init__(self, name, func, params, bounds):
+        self.name = name
+        self.func = func
+        self.params = list(params)
+        self.bounds = (list(bounds[0]), list(bounds[1]))
+
+
+MODELS = [
+    FitModel("linear", linear, ["k", "intercept"], ([0.00, 0], [5, 100])),
+    FitModel("rise_exp2", rise_exp2, ["k", "top", "offset"], ([0.001, 0, 0], [500.0, 50, 10])),
+    FitModel("decay_exp2", decay_exp2, ["k", "top", "bottom"], ([0, -50, 0], [5, 50, 10])),
+    FitModel("boltzman", boltzman, ["x0", "k", "top", "bottom"], ([0, 0.1, 0, 0], [500, 500, 10, 10])),
+    FitModel("sigmoid", sigmoid, ["x0", "k", "top", "bottom"], ([0, 0, 0.01, 0], [500, 5, 10, 10])),
+]
+
+
+def fit_model(model, x, y):
+    """ popt and pcov of a model, NaN if curve_fit does not converge. """
+    from scipy.optimize import curve_fit
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            popt, pcov = curve_fit(model.func, x, y, maxfev=10000, bounds=model.bounds)
+    except (RuntimeError, ValueError) as e:
+        print("Fit of", model.name, "failed: ", e)
+        n = len(model.params)
+        popt, pcov = np.full(n, np.nan), np.full((n, n), np.nan)
+    return {"popt": popt, "pcov": pcov}
+
+
+def _fit(args):
+    return fit_model(*args)
+
+
+def fit_models(x, y, models=MODELS, workers=1, cache=None):
+    """
+    Fit and score candidate models.
+
+    x, y: no of colonies and fuel consumption [L / km] of the survey
+    models: list of FitModel
+    workers: number of worker processes, 1 fits in this process
+    cache: directory of cached fits, None always refits
+
+    returns dict model name -> dict of popt, pcov, r_2 and aic; and a frame
+    comparing the models, best AIC first
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    store = PartitionStore(cache) if cache else None
+    data = pd.DataFrame({"x": x, "y": y})
+
+    fits, keys = {}, {}
+    for model in models:
+        keys[model.name] = fingerprint(data, model.name, inspect.getsource(model.func), model.params, model.bounds)
+        if store is not None:
+            fit = store.get(model.name, keys[model.name])
+            if fit is not None:
+                fits[model.name] = fit
+
+    stale = [model for model in models if model.name not in fits]
+    print("Fuel models: ", len(models), " fitted: ", len(stale), " ", [model.name for model in stale])
+    if workers <= 1 or len(stale) <= 1:
+        fitted = [fit_model(model, x, y) for model in stale]
+    else:
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=min(workers, len(stale)), mp_context=multiprocessing.get_context(method)) as pool:
+            fitted = list(pool.map(_fit, [(model, x, y) for model in stale]))
+    for model, fit in zip(stale, fitted):
+        fits[model.name] = fit
+        if store is not None:
+            store.put(model.name, keys[model.name], fit)
+
+    """ score all models at once """
+    predictions = np.array([model.func(x, *fits[model.name]["popt"]) for model in models])
+    n_params = np.array([len(model.params) for model in models])
+    r_2 = r_squares(y, predictions)
+    aic_score = aic(y, predictions, n_params)
+
+    for model, r, a in zip(models, r_2, aic_score):
+        fits[model.name]["r_2"] = r
+        fits[model.name]["aic"] = a
+
+    comparison = pd.DataFrame({
+        "model": [model.name for model in models],
+        "parameters": [", ".join(f"{p}={v:.4g}" for p, v in zip(model.params, fits[model.name]["popt"])) for model in models],
+        "r_2": r_2,
+        "aic": aic_score}).sort_values("aic", kind="stable").reset_index(drop=True)
+
+    return {model.name: fits[model.name] for model in models}, comparison
+
+
+
+def _curve_fit(func, bounds, x, y):
+    from scipy.optimize import curve_fit
+    return curve_fit(func, x, y, maxfev=10000, bounds=bounds)[0]
+
+
+def _fit_resamples(args):
+    """ popt of resamples of the survey drawn from one seeded stream. """
+    candidate, x, y, resamples, seed = args
+    rng = np.random.default_rng(seed)
+    samples = np.full((resamples, len(candidate.params)), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for i in range(resamples):
+            idx = rng.integers(0, len(x), len(x))
+            try:
+                samples[i] = _curve_fit(candidate.func, candidate.bounds, x[idx], y[idx])
+            except (RuntimeError, ValueError):
+                pass
+    return samples
+
+
+def linear_least_squares(x, y, bounds=None):
+    """
+    Closed form least squares fits of linear to many samples at once.
+
+    x, y: arrays with one sample per row
+    bounds: (lower, upper) bounds of k and intercept; rows whose unbounded
+        fit is out of bounds are refitted with curve_fit
+
+    returns array of k and intercept, one row per sample
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    dx = x - x.mean(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        k = np.sum(dx * (y - y.mean(axis=1, keepdims=True)), axis=1) / np.sum(dx ** 2, axis=1)
+    samples = np.column_stack([k, y.mean(axis=1) - k * x.mean(axis=1)])
+
+    if bounds is not None:
+        outside = np.flatnonzero(np.any((samples < bounds[0]) | (samples > bounds[1]), axis=1))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for i in outside:
+                samples[i] = _curve_fit(linear, bounds, x[i], y[i])
+    return samples
+
+
+def resample_parameters(candidate, x, y, method="bootstrap", resamples=1000, seed=0, workers=1, chunk=100):
+    """
+    Parameters of a model fitted to resamples of the survey.
+
+    candidate: FitModel
+    method: "bootstrap", resamples with replacement; or "jackknife", every
+        sample leaving out one point
+    seed: seed of the bootstrap; every chunk of resamples draws from its own
+        stream spawned from it, so results do not depend on workers
+    workers: number of worker processes for models other than linear, which
+        is solved in closed form for all resamples at once
+
+    returns array of parameters, one row per resample; NaN where a fit failed
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+
+    if method == "jackknife":
+        idx = np.array([np.delete(np.arange(n), i) for i in range(n)])
+    elif method == "bootstrap":
+        idx = None
+    else:
+        raise ValueError("Unknown resampling method: " + str(method))
+
+    if candidate.func is linear:
+        if idx is None:
+            idx = np.random.default_rng(seed).integers(0, n, (resamples, n))
+        return linear_least_squares(x[idx], y[idx], candidate.bounds)
+
+    if idx is not None:
+        return np.array([fit_model(candidate, x[rows], y[rows])["popt"] for rows in idx])
+
+    streams = np.random.SeedSequence(seed).spawn((resamples + chunk - 1) // chunk)
+    tasks = [(candidate, x, y, min(chunk, resamples - i * chunk), stream) for i, stream in enumerate(streams)]
+    if workers <= 1 or len(tasks) <= 1:
+        return np.concatenate([_fit_resamples(task) for task in tasks])
+    start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context(start_method)) as pool:
+        return np.concatenate(list(pool.map(_fit_resamples, tasks)))
+
+
+def parameter_intervals(candidate, popt, samples, x, method="bootstrap", level=0.95):
+    """
+    Confidence intervals of the parameters of a model and of its prediction at x.
+
+    Bootstrap intervals are the percentiles of the resamples; jackknife
+    intervals are normal, from the jackknife standard error.
+
+    candidate: FitModel
+    popt: parameters fitted to the whole survey
+    samples: parameters of the resamples, see resample_parameters
+
+    returns frame of the parameters (rows) and frame of the prediction at x,
+    both with columns value, low and high
+    """
+    from scipy.stats import norm
+
+    samples = samples[~np.isnan(samples).any(axis=1)]
+    x = np.asarray(x, dtype=float)
+    predicted = candidate.func(x[None, :], *[samples[:, [i]] for i in range(samples.shape[1])])
+    value = candidate.func(x, *popt)
+
+    def interval(center, values):
+        if method == "jackknife":
+            m = len(values)
+            se = np.sqrt((m - 1) / m * np.sum((values - values.mean(axis=0)) ** 2, axis=0))
+            z = norm.ppf(0.5 + level / 2)
+            return center - z * se, center + z * se
+        return tuple(np.percentile(values, [50 - 50 * level, 50 + 50 * level], axis=0))
+
+    low, high = interval(np.asarray(popt, dtype=float), samples)
+    parameters = pd.DataFrame({"value": popt, "low": low, "high": high}, index=candidate.params)
+    low, high = interval(value, predicted)
+    prediction = pd.DataFrame({"x": x, "value": value, "low": low, "high": high})
+    return parameters, prediction
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the graphhopper /route endpoint.
+
+Implements the subset of the API used by preprocessing_2: paths[0].distance,
+time, points (json or encoded, with elevation) and the road_class and
+distance details. Routes are synthetic but deterministic: the same origin and
+destination always give the same geometry and road classes. Latency, server
+errors and "no path" answers can be injected, so routing throughput, caching
+and retries can be load-tested without a java graphhopper instance.
+
+    python hopper_standin.py --port 8989 --latency 40 --jitter 20 --error-rate 0.02
+
+Point hopper_url in config.yaml to http://localhost:8989/route to use it.
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from route_geometry import EARTH_RADIUS, encode_polyline
+
+ROAD_CLASSES = ["motorway", "trunk", "primary", "secondary", "tertiary", "residential", "unclassified"]
+SPEEDS = {  # km/h
+    "motorway": 90, "trunk": 75, "primary": 65, "secondary": 55,
+    "tertiary": 45, "residential": 30, "unclassified": 35}
+POINT_SPACING = 100.0  # m between synthetic route points
+
+
+def synthetic_path(origin, dest, points_encoded=False):
+    """ Deterministic route between two (lat, lon) points.
+
+    :return: graphhopper path dict
+    """
+    seed = int.from_bytes(hashlib.sha1(json.dumps([origin, dest]).encode()).digest()[:8], "little")
+    rng = np.random.default_rng(seed)
+
+    (lat0, lon0), (lat1, lon1) = origin, dest
+    air = EARTH_RADIUS * np.hypot(
+        np.deg2rad(lat1 - lat0), np.deg2rad(lon1 - lon0) * np.cos(np.deg2rad((lat0 + lat1) / 2)))
+    n = int(np.clip(air * 1.3 / POINT_SPACING, 2, 20000))
+
+    # Straight line with a smooth detour, roads are never straight.
+    t = np.linspace(0, 1, n)
+    bend = np.sin(np.pi * t) * rng.normal(0, 0.1) + np.cumsum(rng.normal(0, 1e-5, n)) * (1 - t)
+    lat = lat0 + (lat1 - lat0) * t - bend * (lon1 - lon0)
+    lon = lon0 + (lon1 - lon0) * t + bend * (lat1 - lat0)
+    elevation = 300 + np.cumsum(rng.normal(0, 1, n))
+    coordinates = np.round(np.column_stack([lon, lat, elevation]) * [1e5, 1e5, 100]) / [1e5, 1e5, 100]
+
+    # Edge lengths.
+    dlat = np.deg2rad(np.diff(coordinates[:, 1]))
+    dlon = np.deg2rad(np.diff(coordinates[:, 0])) * np.cos(np.deg2rad(coordinates[:-1, 1]))
+    edges = EARTH_RADIUS * np.hypot(dlat, dlon)
+
+    # Road classes over contiguous point intervals.
+    cuts = np.unique(rng.integers(1, n - 1, size=min(n - 2, rng.integers(0, 6)))) if n > 2 else []
+    bounds = [0] + [int(c) for c in cuts] + [n - 1]
+    road_class = [[a, b, ROAD_CLASSES[rng.integers(len(ROAD_CLASSES))]] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    speed = np.empty(n - 1)
+    for a, b, name in road_class:
+        speed[a:b] = SPEEDS[name] / 3.6
+
+    if points_encoded:
+        points = encode_polyline(coordinates)
+    else:
+        points = {"type": "LineString", "coordinates": coordinates.tolist()}
+
+    return {
+        "distance": float(np.round(edges.sum(), 3)),
+        "time": int(np.round(1000 * (edges / speed).sum())),
+        "points_encoded": points_encoded,
+        "points": points,
+        "details": {
+            "road_class": road_class,
+            "distance": [[k, k + 1, float(d)] for k, d in enumerate(edges)]}}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like graphhopper's jetty.
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        out = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        try:
+            self.wfile.write(out)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client gave up, e.g. after its read timeout.
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/route":
+            return self.reply(404, {"message": "Not found"})
+
+        server = self.server
+        with server.lock:
+            delay = max(0.0, server.rng.gauss(server.latency, server.jitter))
+            error = server.rng.random() < server.error_rate
+            no_path = server.rng.random() < server.no_path_rate
+            server.requests += 1
+        time.sleep(delay)
+
+        if error:
+            return self.reply(503, {"message": "Service temporarily unavailable (injected)"})
+
+        query = parse_qs(url.query)
+        try:
+            points = [tuple(float(c) for c in p.split(",")) for p in query["point"]]
+        except (KeyError, ValueError):
+            return self.reply(400, {"message": "Point parameters are missing or invalid"})
+        if len(points) != 2:
+            return self.reply(400, {"message": "Only routes between two points are supported"})
+        for k, (lat, lon) in enumerate(points):
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                return self.reply(400, {"message": f"Point {k} is out of bounds: {lat},{lon}"})
+        if no_path:
+            return self.reply(400, {"message": "Connection between locations not found"})
+
+        encoded = query.get("points_encoded", ["true"])[0] == "true"
+        self.reply(200, {"paths": [synthetic_path(points[0], points[1], encoded)]})
+
+
+def serve(host="127.0.0.1", port=8989, latency=0.0, jitter=0.0, error_rate=0.0, no_path_rate=0.0, seed=0):
+    """ Start the stand-in in a background thread.
+
+    :param latency: mean added response time [s]
+    :param jitter: standard deviation of the added response time [s]
+    :param error_rate: share of requests answered with HTTP 503
+    :param no_path_rate: share of requests answered with "no path" (HTTP 400)
+    :param seed: seed of the injected latency and failures
+    :return: the server, stop it with server.shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.latency, server.jitter = latency, jitter
+    server.error_rate, server.no_path_rate = error_rate, no_path_rate
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8989)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean added latency [ms]")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency [ms]")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 503 answers")
+    parser.add_argument("--no-path-rate", type=float, default=0.0, help="share of 'no path' answers")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = serve(
+        args.host, args.port, args.latency / 1000, args.jitter / 1000,
+        args.error_rate, args.no_path_rate, args.seed)
+    print(f"graphhopper stand-in on http://{args.host}:{args.port}/route")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
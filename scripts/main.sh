@@ -5,6 +5,9 @@
 # Input and output paths/filenames are read from config.yaml. This also includes
 # the url where the local installation of graphhopper routing engine is 
 # accessible.
+#
+# Stages that are up to date are skipped, see pipeline.py; pass --force to run
+# everything, or --stages to run some of them.
 
 # Assumes that the conda env exists. See requirements.txt for specifications.
 #
@@ -14,17 +17,5 @@
 eval "$(conda shell.bash hook)"
 conda activate migrations
 
-python preprocessing_1.py &&
-echo "preprocessing_1 done"
-  
-python preprocessing_2.py &&
-echo "preprocessing_2 done"
-
-python model_of_travel_costs.py &&
-echo "model_of_travel_costs done"
- 
-python migrations_fuel_calculations.py &&
-echo "fuel_calculations done"
-
-python3.9 "migrations_stats.py" &&
-echo "migrations_stats done"
+cd "$(dirname "$0")" &&
+python pipeline.py "$@"
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Figures of the analysis of colony migrations in Slovenia
+#
+# author: Janez Prešern, KIS
+#
+# Draws Figs. 3-7 and 9 from the tables stored by migrations_stats.py. Every
+# figure is rendered in its own worker process on the Agg backend. Figures
+# are named by their config key; the "figures" config key lists the figures
+# to draw (all if missing, none if empty), --figures overrides it:
+#
+#     python migrations_figures.py --figures travel_time_fig yearly_costs_fig
+
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")  # Figures are only saved.
+
+import yaml
+import matplotlib.pyplot as plt
+import numpy as np
+import seaborn as sns
+from storage import open_store
+
+with open("config.yaml") as f:
+    CONFIG = yaml.load(f, Loader=yaml.FullLoader)
+
+LABELSIZE = 12  # The default size of the font used in figures.
+
+
+def colony_moves_by_year(tables, fn):
+    """ Figure 3, number of migrations and of migrated colonies per year. """
+    sns.set_style('white')
+
+    f0 = plt.figure(figsize=(170/25.4, 170/25.4), dpi=600)
+    #a00 = f0.add_axes([0.15, 0.55, 0.70, 0.4])
+    a00 = f0.add_axes([0.15, 0.55, 0.60, 0.4])
+    a00_twin = a00.twinx()
+
+    sns.barplot(tables["stats migrations"], x="year", y="n_of_migrations", ax=a00, color = "darkgrey")
+    sns.barplot(tables["stats migrations augmented"], x="year", y="n_of_migrations", ax=a00_twin, color="teal")
+
+    a00.set_ylabel("Number of migrations per year", fontsize=LABELSIZE, color="grey")
+    a00.set_xlabel("")
+    a00.tick_params(axis='y', labelcolor="darkgrey", labelsize=LABELSIZE)
+
+    a00_twin.set_ylim(a00.get_ylim())
+    a00_twin.set_ylabel("Number of migrations\nmore than 8 colonies and more than 5 km", color="teal", fontsize=LABELSIZE)
+    a00_twin.tick_params(axis='y', labelcolor="teal", labelsize=LABELSIZE)
+    a00.tick_params(axis='both', which='major', labelsize=LABELSIZE)
+    a00_twin.tick_params(axis='both', which='major', labelsize=LABELSIZE)
+
+    #a01 = f0.add_axes([0.15, 0.08, 0.70, 0.4]); a01_twin = a01.twinx()
+    a01 = f0.add_axes([0.15, 0.09, 0.60, 0.4]); a01_twin = a01.twinx()
+    sns.barplot(tables["stats colony migrations"], x="year", y="n_of_colony_migrations", ax=a01, color="darkgrey")
+    sns.barplot(tables["stats colony migrations augmented"], x="year", y="n_of_colony_migrations", ax=a01_twin, color="teal")
+
+    a01.set_ylabel("Number of migrated colonies", fontsize=LABELSIZE, color="grey")
+    a01.set_xlabel("Year", fontsize=LABELSIZE)
+    a01.tick_params(axis='y', labelcolor="darkgrey")
+
+    a01_twin.set_ylim(a01.get_ylim())
+    a01_twin.set_ylabel("Number of migrated colonies\nmore than 8 colonies and more than 5 km", color="teal", fontsize=LABELSIZE)
+    a01_twin.tick_params(axis='y', labelcolor="teal", labelsize=LABELSIZE)
+
+    a01.tick_params(axis='both', which='major', labelsize=LABELSIZE)
+    a01_twin.tick_params(axis='both', which='major', labelsize=LABELSIZE)
+
+    f0.savefig(fn)
+
+
+def yearly_migration_dynamics(tables, fn):
+    """ Figure 4, colonies migrated per week, by year. """
+    sns.set_style('white')
+
+    grid2 = sns.FacetGrid(
+        tables["stats weekly augmented"],
+        col="year",
+        hue="year",
+        palette="tab20c",
+        col_wrap=3,
+        height=1.5,
+        despine=False
+    )
+
+    grid2.fig.subplots_adjust(wspace=0, hspace=0)
+    grid2.fig.set_size_inches(170/25.4, 170/25.4)
+
+    grid2.map(plt.plot, "week", "FAMILY_MOVE", marker="o", ms=2, linewidth=1, color='black')  # Added ms
+    grid2.set_ylabels("Colonies migrated", size=LABELSIZE)
+    grid2.set_xlabels("Week", size=LABELSIZE)
+    grid2.set_titles(size=LABELSIZE)
+    grid2.tick_params(axis='both', which='major',labelsize=LABELSIZE)
+
+    grid2.fig.savefig(fn, dpi=600)
+
+
+def colony_packaging(tables, fn):
+    """ Figure 5, number of colonies packed in a single migration. """
+    sns.set_style('white')
+
+    f2_1 = plt.figure(
+        figsize=(170/25.4, 65/25.4),
+        dpi=300
+    )
+
+    #a20_1 = f2_1.add_axes([0.15, 0.15, 0.8, 0.75])
+    a20_1 = f2_1.add_axes([0.15, 0.20, 0.8, 0.70])
+
+    sns.histplot(data=tables["stats moves"]["FAMILY_MOVE"], bins=np.arange(0, 221, 1), ax=a20_1, color="teal")
+
+    a20_1.set_ylabel("No. of migrations", fontsize=LABELSIZE)
+    a20_1.set_xlabel("No. of colonies packed in single migration", fontsize=LABELSIZE)
+    a20_1.set_title("Colony packaging by migration", fontsize=LABELSIZE)
+    a20_1.set_xlim(0, 100)
+
+    a20_1.tick_params(axis='both', labelsize=LABELSIZE)
+
+    f2_1.savefig(fn)
+
+
+def yearly_distances_traveled_cumulative(tables, fn):
+    """ Figure 6, cumulative travel distance per year. """
+    sns.set_style("white")
+
+    f6 = plt.figure(figsize=(170/25.4, 85/25.4), dpi=600)
+    #a60 = f6.add_axes([0.15, 0.15, 0.68, 0.75])
+    a60 = f6.add_axes([0.15, 0.20, 0.68, 0.75])
+    a60_twin = a60.twinx()
+
+    sns.barplot(tables["stats distances"], x="year", y="razdalja [km]", color="teal", ax=a60)
+    sns.barplot(tables["stats distances small"], x="year", y="razdalja [km]", color="black", ax=a60_twin)
+
+    a60.set_ylabel("Cumulative travel distance [km]", fontsize=LABELSIZE, color="teal")
+    a60_twin.set_ylabel("Cumulative travel distance\n by small beekeepers [km]", fontsize=LABELSIZE)
+    a60.set_xlabel("Year", fontsize=LABELSIZE)
+
+    a60.tick_params(axis='both', which='major', labelsize=LABELSIZE)
+    a60.tick_params(axis='y', color="teal", labelcolor="teal")
+    a60_twin.tick_params(axis='both', which='major', labelsize=LABELSIZE)
+    a60_twin.set_ylim(a60.get_ylim())
+
+    f6.savefig(fn)
+
+
+def travel_time(tables, fn):
+    """ Figure 7, travel times within single migration. """
+    sns.set_style('white')
+
+    f_traveled_distances = plt.figure(figsize=(170/25.4, 89/25.4), dpi=600)
+    #a_traveled_distances = f_traveled_distances.add_axes((0.15, 0.15, 0.80, 0.75))
+    a_traveled_distances = f_traveled_distances.add_axes((0.15, 0.20, 0.80, 0.70))
+
+    sns.histplot(data=tables["stats moves"]["travel_time"], bins=np.arange(0, 300, 5), ax=a_traveled_distances, color="teal")
+    a_traveled_distances.set_xlabel("Travel times within single migration [minutes]", fontsize=LABELSIZE)
+    a_traveled_distances.set_ylabel("Count", fontsize=LABELSIZE)
+    #a_traveled_distances.tick_params(axis='both', labelsize=LABELSIZE)
+    f_traveled_distances.savefig(fn)
+
+
+def yearly_costs(tables, fn):
+    """ Figure 9, yearly costs of fuel and toll. """
+    sns.set_style('white')
+
+    df_cost_total = tables["stats cost total"]
+    f_fuel = plt.figure(figsize=(170/25.4, 85/25.4), dpi=600)
+    a_fuel = f_fuel.add_axes((0.15, 0.20, 0.80, 0.70))
+    sns.barplot(data=df_cost_total, x="year", y="total cost Euro 0 - 2", color="darkgrey", ax=a_fuel, label="toll Euro 0 - 2")
+    sns.barplot(data=df_cost_total, x="year", y="total cost Euro 6, EEV", color="lightgrey", ax=a_fuel, label="toll Euro 6, EEV")
+    sns.barplot(data=tables["stats fuel"], x="year", y="fuel paid", ax=a_fuel, color="teal", label="fuel")
+    a_fuel.set_ylabel('Yearly costs of hive transport in €', fontsize=LABELSIZE)
+    a_fuel.set_xlabel('Year', fontsize=LABELSIZE)
+    a_fuel.tick_params(axis='both', which='major', labelsize=LABELSIZE)
+
+    a_fuel.legend(
+        fontsize=LABELSIZE,
+        ncol=3,
+        bbox_to_anchor=(0.5, 1.075),
+        loc='center'
+    )
+
+    f_fuel.savefig(fn)
+
+
+# Figures by config key of their file, and the tables they draw.
+FIGURES = {
+    "colony_moves_by_year": (colony_moves_by_year, ["stats migrations", "stats migrations augmented", "stats colony migrations", "stats colony migrations augmented"]),
+    "yearly_migration_dynamics": (yearly_migration_dynamics, ["stats weekly augmented"]),
+    "colony_packaging": (colony_packaging, ["stats moves"]),
+    "yearly_distances_traveled_cumulative": (yearly_distances_traveled_cumulative, ["stats distances", "stats distances small"]),
+    "travel_time_fig": (travel_time, ["stats moves"]),
+    "yearly_costs_fig": (yearly_costs, ["stats fuel", "stats cost total"]),
+}
+
+
+""" tables of the figures, shared with the worker processes """
+_tables = None
+
+
+def _share_tables(tables):
+    global _tables
+    _tables = tables
+
+
+def _render(name):
+    draw, _ = FIGURES[name]
+    draw(_tables, f'{CONFIG[name]}.pdf')
+    plt.close("all")
+    return name
+
+
+def render_figures(names, tables, workers=1):
+    """
+    Render figures, each in a worker process.
+
+    names: config keys of the figures, see FIGURES
+    tables: dict table name -> frame, see migrations_stats.py
+    workers: number of worker processes, 1 renders in this process
+    """
+    if workers <= 1 or len(names) <= 1:
+        _share_tables(tables)
+        return [_render(name) for name in names]
+
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=min(workers, len(names)), mp_context=multiprocessing.get_context(method),
+                             initializer=_share_tables, initargs=(tables,)) as pool:
+        return list(pool.map(_render, names))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Draw Figs. 3-7 and 9.")
+    parser.add_argument("--figures", nargs="*", choices=list(FIGURES), help="figures to draw, default the figures key of config.yaml")
+    # Ignore the options of pipeline.py when run as its stage.
+    args, _ = parser.parse_known_args()
+
+    names = args.figures if args.figures is not None else CONFIG.get('figures', list(FIGURES))
+    store = open_store(CONFIG)
+    tables = {table: store.read(table) for name in names for table in FIGURES[name][1]}
+    render_figures(names, tables, CONFIG.get('figure_workers', 1))
+    print("Figures: ", ", ".join(names) if names else "none")
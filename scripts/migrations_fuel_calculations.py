@@ -8,6 +8,7 @@ every journey:
     * Add also the percentage travelled on motorway
     * Add also cost per hive move, for individual move
     * Inserts yearly recommended honey price
+    * Quantiles of the costs per move and per year, see cost_uncertainty.py
 
 """
 __author__ = "janez presern, anja pavlin, andraz marinc"
@@ -15,17 +16,15 @@ __author__ = "janez presern, anja pavlin, andraz marinc"
 
 
 import yaml
-import matplotlib.pyplot as plt
+from functools import partial
 import pandas as pd
 import numpy as np
-from utils import decay_exp2, rise_exp2, linear, r_square, unp_decay_exp2, unp_rise_exp2
-from scipy.optimize import curve_fit, minimize
-import uncertainties as unc
-import uncertainties.unumpy as unp
-from RegscorePy import aic
-from lmfit import Model
-import seaborn as sns
-from PIL import Image
+from utils import linear, linear_unc, unp_rise_exp2
+from partitions import code_fingerprint, partition_store, run_partitions
+from storage import open_store
+from tariffs import Tariff, lookup_tariffs
+from cost_uncertainty import simulate_costs
+from fuel_models import MODELS, fit_models, resample_parameters, parameter_intervals
 
 LABELSIZE = 15 # Default fontsize for figures.
 
@@ -34,6 +33,10 @@ with open("config.yaml") as f:
 
 
 def fit_the_data (df, fits):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import uncertainties as unc
+    import uncertainties.unumpy as unp
 
     df = df[["towing vehicle", "migratory unit", "no of colonies", "fuel consumption", "fuel consumption [L / km]"]]
     df = df.dropna()
@@ -42,27 +45,17 @@ def fit_the_data (df, fits):
     arr = df[["no of colonies", "fuel consumption [L / km]"]].values
 
     x = np.linspace(df["no of colonies"].min(), df["no of colonies"].max(), 100)
+    """ fit and score the candidate models, see fuel_models.py """
+    models, comparison = fit_models(arr[:, 0], arr[:, 1], workers=CONFIG.get('fit_workers', 1), cache=CONFIG.get('fit_cache'))
+    print(comparison.to_string(index=False))
+
     """ fit exp"""
-    popt_e, pcov_e = curve_fit(rise_exp2, arr[:, 0], arr[:, 1], maxfev=10000, bounds=([0.001, 0, 0], [500.0, 50, 10]))
-    y_e = rise_exp2(x, popt_e[0], popt_e[1], popt_e[2])
-    y_pred_e = rise_exp2(arr[:, 0], popt_e[0], popt_e[1], popt_e[2])
+    popt_e, pcov_e = models["rise_exp2"]["popt"], models["rise_exp2"]["pcov"]
 
     """ fit lin """
-    popt_l, pcov_l = curve_fit(linear, arr[:, 0], arr[:, 1], maxfev=10000, bounds=([0.00, 0], [5, 100]))
+    popt_l, pcov_l = models["linear"]["popt"], models["linear"]["pcov"]
 
     y_l = linear(x, popt_l[0], popt_l[1])
-    y_pred_l = linear(arr[:, 0], popt_l[0], popt_l[1])
-
-    """ fit LMFIT """
-    e_model = Model(rise_exp2)
-    e_pars = e_model.make_params(k=popt_e[0], top=popt_e[1], offset=popt_e[2])
-    e_pars['k'].max = 500.0
-    e_pars['k'].min = 0.001
-    e_pars['top'].max = 100
-    e_pars['top'].min = 0
-    e_pars['offset'].max = 10
-    e_pars['offset'].min = 0
-    e_res = e_model.fit(arr[:, 1], e_pars, x=arr[:, 0])
 
     """ uncertanities exponential """
     k_e, top_e, offset_e = unc.correlated_values(popt_e, pcov_e)
@@ -76,17 +69,36 @@ def fit_the_data (df, fits):
     nom_l = unp.nominal_values(py_l)
     std_l = unp.std_devs(py_l)
 
+    """ confidence intervals of the linear fit and of the consumption at each hive count: asymptotic from pcov, or from resamples of the survey """
+    method = CONFIG.get('calibration_intervals', 'asymptotic')
+    level = CONFIG.get('calibration_level', 0.95)
+    hives = np.arange(df["no of colonies"].min(), df["no of colonies"].max() + 1)
+    if method == "asymptotic":
+        from scipy.stats import norm
+        z = norm.ppf(0.5 + level / 2)
+        perr_l = np.sqrt(np.diag(pcov_l))
+        parameters = pd.DataFrame({"value": popt_l, "low": popt_l - z * perr_l, "high": popt_l + z * perr_l}, index=["k", "intercept"])
+        value, std = linear_unc(hives, *popt_l, pcov_l[0, 0], pcov_l[0, 1], pcov_l[1, 1])
+        intervals = pd.DataFrame({"x": hives, "value": value, "low": value - z * std, "high": value + z * std})
+        # z = 1.96 at the default level; Fig. 8 was published with 2 standard deviations (level 0.9545).
+        band_low, band_high = nom_l - z * std_l, nom_l + z * std_l
+    else:
+        samples = resample_parameters(
+            MODELS[0], arr[:, 0], arr[:, 1], method, resamples=CONFIG.get('calibration_resamples', 2000),
+            seed=CONFIG.get('calibration_seed', 0), workers=CONFIG.get('fit_workers', 1))
+        parameters, intervals = parameter_intervals(MODELS[0], popt_l, samples, hives, method, level)
+        band = parameter_intervals(MODELS[0], popt_l, samples, x, method, level)[1]
+        band_low, band_high = band["low"].values, band["high"].values
+    intervals = intervals.rename(columns={"x": "no of colonies", "value": "fuel consumption [L / km]"})
+    intervals["method"] = method
+
     """ aic score exp lin """
-    aic_score_exp = aic.aic(arr[:, 1], y_pred_e, 3)
-    aic_score_lin = aic.aic(arr[:, 1], y_pred_l, 2)
+    aic_score_exp = models["rise_exp2"]["aic"]
+    aic_score_lin = models["linear"]["aic"]
 
     """ compute R2 """
-    r_2_e = r_square(arr[:, 0], arr[:, 1], popt_e, rise_exp2)
-    r_2_l = r_square(arr[:, 0], arr[:, 1], popt_l, linear)
-
-    """ stdev on parameter use"""
-    perr_e = np.sqrt(np.diag(pcov_e))
-    perr_l = np.sqrt(np.diag(pcov_l))
+    r_2_e = models["rise_exp2"]["r_2"]
+    r_2_l = models["linear"]["r_2"]
 
 
     """ store the hit """
@@ -96,7 +108,13 @@ def fit_the_data (df, fits):
     fits.loc[0, "intercept_linear"] = popt_l[1]
     fits.loc[0, "k_unc_lin"] = k_l
     fits.loc[0, "intercept_unc_lin"] = intercept_l
+    fits.loc[0, "var_k_lin"] = pcov_l[0, 0]
+    fits.loc[0, "cov_k_intercept_lin"] = pcov_l[0, 1]
+    fits.loc[0, "var_intercept_lin"] = pcov_l[1, 1]
     fits.loc[0, "aic_lin"] = aic_score_lin
+    fits.loc[0, "intervals"] = method
+    fits.loc[0, "k_linear low"], fits.loc[0, "k_linear high"] = parameters.loc["k", ["low", "high"]]
+    fits.loc[0, "intercept_linear low"], fits.loc[0, "intercept_linear high"] = parameters.loc["intercept", ["low", "high"]]
 
     fits.loc[0, "r_2_e"] = r_2_e
     fits.loc[0, "k_e"] = popt_e[0]
@@ -112,7 +130,7 @@ def fit_the_data (df, fits):
     f = plt.figure(figsize=(170/25.4, 143/25.4))
     a = f.add_subplot(111)
 
-    a.fill_between(x, nom_l*100 - 2 * std_l*100, nom_l*100 + 2 * std_l*100, color="k", alpha=0.25)
+    a.fill_between(x, band_low*100, band_high*100, color="k", alpha=0.25)
     a.plot(x, y_l*100, color="k", linestyle="--", linewidth=3)
     sns.scatterplot(
         df, 
@@ -130,61 +148,52 @@ def fit_the_data (df, fits):
     a.legend(fontsize=LABELSIZE)
 
     a.text(90, 27, '$R^2$ = '  + str(np.round(r_2_l, 2)), rotation=30, fontsize=LABELSIZE)
-    f.savefig(f'{CONFIG['fuel_consumption_calibration_fig']}.pdf')
+    f.savefig(f'{CONFIG["fuel_consumption_calibration_fig"]}.pdf')
 
     
-    writer = pd.ExcelWriter(CONFIG['fuel_calibrations'])
-    fits.to_excel(writer, sheet_name="fuel_calibration", index=False)
-    writer.close()
+    open_store(CONFIG).write({"fuel_calibration": fits, "fuel model comparison": comparison, "fuel consumption intervals": intervals})
 
     pass
 
     return fits
 
-if __name__ == "__main__":
-
+def add_costs(df_migrations, df_fuel, df_toll, fits, df_honey_price):
+    """ Fuel prices, fuel consumption, toll and costs of every move.
 
+    df_migrations: moves with travel distances and motorway kilometers
+    df_fuel, df_toll: diesel prices and toll by date interval
+    fits: fuel consumption fits, see fit_the_data
+    df_honey_price: recommended honey price by year
 
-    """ fuel consumption """
-    consumption_fn = CONFIG['survey_results']
-    df_consumption = pd.read_excel(consumption_fn, sheet_name='transportation')
-    df_honey_price = pd.read_excel(consumption_fn, sheet_name='honey_prices')
-
-    """ migration data """
-    migrations_fn = CONFIG['migrations_processed']
-    df_migrations = pd.read_excel(migrations_fn, sheet_name='migrations distances_5 cutoff')
-
-    """ fuel data """
-    fuel_fn = CONFIG['fuel_prices']
-    df_fuel = pd.read_excel(fuel_fn, sheet_name='diesel')
-
-    """ toll data """
-    df_toll = pd.read_excel(fuel_fn, sheet_name='toll')
-
-    """ remove fuel data for 2023 """
-    df_fuel = df_fuel.loc[df_fuel["start_date"] < "2023-01-01"]
-    df_migrations = df_migrations.loc[df_migrations["DATE_MOVE"] < "2023-01-01"]
+    returns df_migrations with the cost columns added, and flags of moves in
+    gaps or overlaps of the tariff tables
+    """
+    """ look up fuel prices and toll (trucks only, > 28 hives) at the date of migration """
+    tariffs = lookup_tariffs(
+        df_migrations.DATE_MOVE,
+        [Tariff("diesel", df_fuel, {"price": "Fuel price"}),
+         Tariff("toll", df_toll, {"Euro 0 - 2": "Euro 0 - 2", "Euro 6, EEV": "Euro 6, EEV"})],
+        applies={"toll": (df_migrations.FAMILY_MOVE > 28).values})
 
     """ assign fuel prices to date of migration """
-    for i, row in df_fuel.iterrows():
-        df_migrations.loc[(df_migrations.DATE_MOVE >= row.start_date) & (df_migrations.DATE_MOVE <= row.end_date), "Fuel price"] = row.price
+    df_migrations["Fuel price"] = tariffs["Fuel price"]
 
-    """ fit equation to fuel consumption from survey """
-    fits = fit_the_data(df_consumption, pd.DataFrame())
+    """ using fit calcualte fuel consumption and its standard deviation for every travel; don't forget to divide the consumption with 100 """
+    fit = fits.iloc[0]
+    consumption, consumption_std = linear_unc(
+        df_migrations.FAMILY_MOVE, fit.k_linear, fit.intercept_linear,
+        fit.var_k_lin, fit.cov_k_intercept_lin, fit.var_intercept_lin)
+    df_migrations["fuel consumption per km"] = consumption
+    df_migrations["fuel consumption per km std"] = consumption_std
 
-    """ using fit calcualte fuel consumption for every travel; don't forget to divide the consumption with 100 """
-    df_migrations["fuel consumption per km unc"] = df_migrations.FAMILY_MOVE.apply(func=linear, args=(fits.iloc[0].k_unc_lin, fits.iloc[0].intercept_unc_lin))
-    df_migrations["fuel consumption per km"] = df_migrations.FAMILY_MOVE.apply(func=linear, args=(fits.iloc[0].k_linear, fits.iloc[0].intercept_linear))
-
-    """ calculate fuel costs for every travel"""
+    """ calculate fuel costs for every travel; distances and prices are exact """
     df_migrations["fuel consumption per travel"] = df_migrations["fuel consumption per km"] * df_migrations["travel_distances"]
     df_migrations["fuel paid"] = df_migrations["fuel consumption per travel"] * df_migrations["Fuel price"]
+    df_migrations["fuel paid std"] = df_migrations["fuel consumption per km std"] * df_migrations["travel_distances"] * df_migrations["Fuel price"]
 
     """ assign toll pracies to date of migration """
-    for j, toll_row in df_toll.iterrows():
-        df_migrations.loc[(df_migrations.DATE_MOVE >= toll_row.start_date) & (df_migrations.DATE_MOVE <= toll_row.end_date) & (df_migrations.FAMILY_MOVE > 28), "Euro 0 - 2"] = toll_row["Euro 0 - 2"]
-        df_migrations.loc[(df_migrations.DATE_MOVE >= toll_row.start_date) & (df_migrations.DATE_MOVE <= toll_row.end_date) & (
-                        df_migrations.FAMILY_MOVE > 28), "Euro 6, EEV"] = toll_row["Euro 6, EEV"]
+    df_migrations["Euro 0 - 2"] = tariffs["Euro 0 - 2"]
+    df_migrations["Euro 6, EEV"] = tariffs["Euro 6, EEV"]
     df_migrations["toll Euro 0 - 3"] = np.nan
     df_migrations["toll Euro 6, EEV"] = np.nan
     df_migrations["toll Euro 0 - 2"] = df_migrations["Euro 0 - 2"] * df_migrations["motorway"]
@@ -202,15 +211,72 @@ if __name__ == "__main__":
 
     """ assign cost per hive moved per kilometer travelled """
     df_migrations["cost per hive moved per kilometer"] = df_migrations["cost per hive moved"]  / df_migrations["travel_distances"]
+    df_migrations["cost per hive moved per kilometer std"] = df_migrations["fuel paid std"] / df_migrations["FAMILY_MOVE"] / df_migrations["travel_distances"]
 
     """ insert yearly recommended honey price """
     B = df_honey_price.set_index("year")[["recommended retail price [kg]"]]
     df_migrations["recommended retail honey price [kg]"] = df_migrations["year"].map(B["recommended retail price [kg]"])
 
+    """ flag moves without a tariff or with several """
+    for flag in ["diesel gap", "diesel overlap", "toll gap", "toll overlap"]:
+        df_migrations[flag] = tariffs[flag]
+        if tariffs[flag].any():
+            print("Moves in a tariff", flag, ": ", int(tariffs[flag].sum()))
+
+    return df_migrations
+
+
+def add_costs_of_partitions(partitions, df_fuel, df_toll, fits, df_honey_price):
+    """ add_costs of every partition (dict key -> moves), see partitions.run_partitions. """
+    return {
+        key: add_costs(df.copy(), df_fuel, df_toll, fits, df_honey_price).reset_index(drop=True)
+        for key, df in partitions.items()}
+
+
+if __name__ == "__main__":
+
+
+
+    """ fuel consumption """
+    consumption_fn = CONFIG['survey_results']
+    df_consumption = pd.read_excel(consumption_fn, sheet_name='transportation')
+    df_honey_price = pd.read_excel(consumption_fn, sheet_name='honey_prices')
+
+    """ migration data """
+    store = open_store(CONFIG)
+    df_migrations = store.read('migrations distances_5 cutoff')
+
+    """ fuel data """
+    fuel_fn = CONFIG['fuel_prices']
+    df_fuel = pd.read_excel(fuel_fn, sheet_name='diesel')
+
+    """ toll data """
+    df_toll = pd.read_excel(fuel_fn, sheet_name='toll')
+
+    """ remove fuel data for 2023 """
+    df_fuel = df_fuel.loc[df_fuel["start_date"] < "2023-01-01"]
+    df_migrations = df_migrations.loc[df_migrations["DATE_MOVE"] < "2023-01-01"]
+
+    """ fit equation to fuel consumption from survey """
+    fits = fit_the_data(df_consumption, pd.DataFrame())
+
+    """ years whose moves, prices and survey did not change keep their costs """
+    partitions = {str(y): df_migrations.loc[df_migrations.year == y] for y in sorted(df_migrations.year.unique())}
+    costs = run_partitions(
+        partition_store(CONFIG, "migrations_fuel_calculations"), partitions,
+        partial(add_costs_of_partitions, df_fuel=df_fuel, df_toll=df_toll, fits=fits, df_honey_price=df_honey_price),
+        [df_fuel, df_toll, df_honey_price, df_consumption, code_fingerprint(__file__)])
+    df_migrations = pd.concat([costs[k].set_axis(partitions[k].index) for k in partitions]).loc[df_migrations.index]
+
+
+    """ distributions of the costs: calibration, fuel price and distance uncertainty """
+    cost_quantiles, yearly_cost_quantiles = simulate_costs(
+        df_migrations, fits.iloc[0], samples=CONFIG.get('cost_samples', 1000),
+        price_cv=CONFIG.get('cost_price_cv', 0.0), distance_cv=CONFIG.get('cost_distance_cv', 0.0),
+        quantiles=CONFIG.get('cost_quantiles', [0.05, 0.5, 0.95]), seed=CONFIG.get('cost_seed', 0))
 
     """ write the df """
-    writer = pd.ExcelWriter(CONFIG['migrations_processed'], engine='openpyxl', mode='a', if_sheet_exists='replace')
-    df_migrations.to_excel(writer, sheet_name="fuel prices included 5km", index=False)
-    writer.close()
+    store.write({"fuel prices included 5km": df_migrations, "cost quantiles": cost_quantiles})
+    store.write({"yearly cost quantiles": yearly_cost_quantiles}, index=True)
 
     pass
@@ -4,407 +4,235 @@
 # Analysis of colony migrations in Slovenia
 # 
 # author: Janez Prešern, KIS
+#
+# Statistics of the migrations, written to Migration_Stats.xlsx. The tables
+# behind Figs. 3-7 and 9 are stored (see storage.py) and drawn by
+# migrations_figures.py, so the statistics can be recomputed without
+# rendering the figures.
 
  
 import yaml
-import itertools as it
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import seaborn.objects as so
-from shapely import Polygon, LineString, Point
-from matplotlib.collections import LineCollection
-from PIL import Image
-
-with open("config.yaml") as f:
-    CONFIG = yaml.load(f, Loader=yaml.FullLoader)
-    
-LABELSIZE = 12  # The default size of the font used in figures.
-
-###########
-# Load data
-###########
-
-# Load pruned and augmented migrations
-migrations_fn = CONFIG['migrations_processed']
-df_migrations = pd.read_excel(migrations_fn, sheet_name='CBZ back migrations appended_0')
-df_migrations = df_migrations.loc[df_migrations.year != 2023]
-
-# Load pruned and augmented migrations, distances travelled and fuel / toll 
-# costs with 5 km cutoff
-migrations_augmented_fn = CONFIG['migrations_processed']
-df_migrations_augmented = pd.read_excel(migrations_augmented_fn, sheet_name='fuel prices included 5km')
-df_migrations_augmented = df_migrations_augmented.loc[df_migrations_augmented.year != 2023]
-
-# Remove the single-direction migrations
-mask = df_migrations_augmented.uuid_migration.value_counts()
-df_migrations_augmented = df_migrations_augmented.loc[df_migrations_augmented.uuid_migration.isin(mask.index[mask > 1])]
-
-
-#################################################
-# Draw the number of all migrations for each year
-#################################################
-df_movements_yearly = df_migrations.groupby(df_migrations.year)["uuid"].count().reset_index(name="n_of_migrations")
-df_movements_augmented_yearly = df_migrations_augmented.groupby(df_migrations_augmented.year)["uuid"].count().reset_index(name="n_of_migrations")
-df_movements_augmented_yearly_small = df_migrations_augmented.loc[df_migrations_augmented.FAMILY_MOVE < 29].groupby(df_migrations_augmented.year)["uuid"].count().reset_index(name="n_of_migrations")
-
-df_movements_augmented_yearly_type = df_migrations_augmented.groupby(["year", "TYPE"])["uuid"].count().reset_index(name="n_of_migrations")
-df_colony_movements_yearly = df_migrations.groupby(["year"])["FAMILY_MOVE"].sum().reset_index(name="n_of_colony_migrations")
-df_colony_movements_augmented_yearly = df_migrations_augmented.groupby(["year"])["FAMILY_MOVE"].sum().reset_index(name="n_of_colony_migrations")
-
-sns.set_style('white')
-
-f0 = plt.figure(figsize=(170/25.4, 170/25.4), dpi=600) 
-#a00 = f0.add_axes([0.15, 0.55, 0.70, 0.4])
-a00 = f0.add_axes([0.15, 0.55, 0.60, 0.4])
-a00_twin = a00.twinx()
-
-sns.barplot(df_movements_yearly, x="year", y="n_of_migrations", ax=a00, color = "darkgrey")
-sns.barplot(df_movements_augmented_yearly, x="year", y="n_of_migrations", ax=a00_twin, color="teal")
-
-a00.set_ylabel("Number of migrations per year", fontsize=LABELSIZE, color="grey")
-a00.set_xlabel("")
-a00.tick_params(axis='y', labelcolor="darkgrey", labelsize=LABELSIZE)
-
-a00_twin.set_ylim(a00.get_ylim())
-a00_twin.set_ylabel("Number of migrations\nmore than 8 colonies and more than 5 km", color="teal", fontsize=LABELSIZE)
-a00_twin.tick_params(axis='y', labelcolor="teal", labelsize=LABELSIZE)
-a00.tick_params(axis='both', which='major', labelsize=LABELSIZE)
-a00_twin.tick_params(axis='both', which='major', labelsize=LABELSIZE)
-
-#a01 = f0.add_axes([0.15, 0.08, 0.70, 0.4]); a01_twin = a01.twinx()
-a01 = f0.add_axes([0.15, 0.09, 0.60, 0.4]); a01_twin = a01.twinx()
-sns.barplot(df_colony_movements_yearly, x="year", y="n_of_colony_migrations", ax=a01, color="darkgrey")
-sns.barplot(df_colony_movements_augmented_yearly, x="year", y="n_of_colony_migrations", ax=a01_twin, color="teal")
-
-a01.set_ylabel("Number of migrated colonies", fontsize=LABELSIZE, color="grey")
-a01.set_xlabel("Year", fontsize=LABELSIZE)
-a01.tick_params(axis='y', labelcolor="darkgrey")
-
-a01_twin.set_ylim(a01.get_ylim())
-a01_twin.set_ylabel("Number of migrated colonies\nmore than 8 colonies and more than 5 km", color="teal", fontsize=LABELSIZE)
-a01_twin.tick_params(axis='y', labelcolor="teal", labelsize=LABELSIZE)
-
-a01.tick_params(axis='both', which='major', labelsize=LABELSIZE)
-a01_twin.tick_params(axis='both', which='major', labelsize=LABELSIZE)
-
-sns.set_style('white')
-
-f0.savefig(f'{CONFIG["colony_moves_by_year"]}.pdf')
-
-# Construct df for storing stats.
-all_stats_migrations_yearly = df_movements_yearly
-all_stats_migrations_yearly_augmented = df_movements_augmented_yearly
-all_stats_migrations_yearly_augmented_small = df_movements_augmented_yearly_small
-
-all_stats_migrations_colony_yearly = df_colony_movements_yearly
-all_stats_migrations_colony_yearly_augmented = df_colony_movements_augmented_yearly
-
-
-""" load data """
-
-
-# Number of beekeepers who relocate their colonies.
-# Get the number of beekeepers registered in particular year.
-origins = CONFIG['origins']
-df_origin = pd.read_excel(origins)
-df_origin = pd.concat([df_origin.iloc[:, 0:5], df_origin.loc[:, df_origin.columns.str.contains("_10")]], axis=1)
-df_origin = df_origin.rename(
-    columns={
-        "CENSUS_2011_10": 2011, "CENSUS_2012_10": 2012,
-        "CENSUS_2013_10": 2013, "CENSUS_2014_10": 2014,
-        "CENSUS_2015_10": 2015, "CENSUS_2016_10": 2016,
-        "CENSUS_2017_10": 2017, "CENSUS_2018_10": 2018,
-        "CENSUS_2019_10": 2019, "CENSUS_2020_10": 2020, 
-        "CENSUS_2021_10": 2021, "CENSUS_2022_10": 2022,
-        "CENSUS_2023_10": 2023
+from partitions import code_fingerprint, partition_store, run_partitions
+from storage import open_store
+
+# Statistics drawn by migrations_figures.py, stored as "stats <name>", and
+# columns of the moves drawn as histograms, stored as "stats moves".
+FIGURE_TABLES = [
+    "migrations", "migrations augmented", "colony migrations", "colony migrations augmented", "weekly augmented",
+    "distances", "distances small", "fuel", "cost total"]
+FIGURE_MOVES = ["FAMILY_MOVE", "travel_time"]
+STORED_TABLES = ["stats " + name for name in FIGURE_TABLES] + ["stats moves"]
+
+
+def yearly_stats(df_migrations, df_migrations_augmented):
+    """ Statistics grouped by year, as a dict of tables.
+
+    Every table only depends on the migrations of its year, so the tables of
+    several years can be computed separately and concatenated, see
+    concat_years.
+    """
+    df_migrations_augmented = df_migrations_augmented.copy()
+    augmented_small = df_migrations_augmented.loc[df_migrations_augmented.FAMILY_MOVE < 29]
+
+    stats = {}
+    stats["migrations"] = df_migrations.groupby(df_migrations.year)["uuid"].count().reset_index(name="n_of_migrations")
+    stats["migrations augmented"] = df_migrations_augmented.groupby(df_migrations_augmented.year)["uuid"].count().reset_index(name="n_of_migrations")
+    stats["migrations augmented small"] = augmented_small.groupby(df_migrations_augmented.year)["uuid"].count().reset_index(name="n_of_migrations")
+    stats["colony migrations"] = df_migrations.groupby(["year"])["FAMILY_MOVE"].sum().reset_index(name="n_of_colony_migrations")
+    stats["colony migrations augmented"] = df_migrations_augmented.groupby(["year"])["FAMILY_MOVE"].sum().reset_index(name="n_of_colony_migrations")
+
+    # Beekeepers that migrated, indexed by year.
+    stats["beekeepers migrated"] = df_migrations.groupby('year')["KMG_MID_origin"].nunique().to_frame(name="n_of_migrations")
+    stats["beekeepers migrated augmented"] = df_migrations_augmented.groupby('year')["KMG_MID_origin"].nunique().to_frame(name="n_of_migrations")
+    stats["beekeepers migrated augmented small"] = augmented_small.groupby('year')["KMG_MID_origin"].nunique().to_frame(name="n_of_migrations")
+
+    stats["weekly"] = df_migrations.groupby(by=["year", "week"])["FAMILY_MOVE"].sum().to_frame().reset_index()
+    stats["weekly augmented"] = df_migrations_augmented.groupby(by=["year", "week"])["FAMILY_MOVE"].sum().to_frame().reset_index()
+
+    stats["distances"] = df_migrations_augmented.groupby(
+        df_migrations_augmented.year
+    )["travel_distances"].sum().reset_index(name="razdalja [km]")
+    stats["distances small"] = augmented_small.groupby(df_migrations_augmented.year)["travel_distances"].sum().reset_index(name="razdalja [km]")
+
+    # Fuel consumption and toll expenditures.
+    df_fuel = df_migrations_augmented.groupby('year')["fuel paid"].sum().reset_index()
+    df_migrations_augmented["toll Euro 0 - 2"] = df_migrations_augmented["motorway"]*df_migrations_augmented["Euro 0 - 2"]
+    df_toll_euro0_2 = df_migrations_augmented.groupby('year')["toll Euro 0 - 2"].sum().reset_index()
+    df_migrations_augmented["toll Euro 6, EEV"] = df_migrations_augmented["motorway"]*df_migrations_augmented["Euro 6, EEV"]
+    df_toll_euro6 = df_migrations_augmented.groupby('year')["toll Euro 6, EEV"].sum().reset_index()
+    stats["fuel"] = df_fuel
+    stats["cost total"] = pd.DataFrame(
+        {
+            "year": df_fuel["year"],
+            "fuel costs only": df_fuel["fuel paid"],
+            "total cost Euro 0 - 2": df_fuel["fuel paid"] + df_toll_euro0_2["toll Euro 0 - 2"],
+            "total cost Euro 6, EEV": df_fuel["fuel paid"] + df_toll_euro6["toll Euro 6, EEV"]
+        }
+    )
+    return stats
+
+
+def stats_of_partitions(partitions):
+    """ yearly_stats of every partition (dict key -> (migrations, augmented
+    migrations)), see partitions.run_partitions. """
+    return {key: yearly_stats(*frames) for key, frames in partitions.items()}
+
+
+def concat_years(tables):
+    """ Concatenate tables of consecutive years; tables indexed by year keep
+    their index. """
+    df = pd.concat(tables)
+    return df if df.index.name == "year" else df.reset_index(drop=True)
+
+
+def load_migrations(store):
+    """ Pruned and augmented migrations (distances travelled and fuel / toll
+    costs with 5 km cutoff) without 2023; single-direction migrations are
+    removed from the augmented ones. """
+    df_migrations = store.read('CBZ back migrations appended_0')
+    df_migrations = df_migrations.loc[df_migrations.year != 2023]
+
+    df_migrations_augmented = store.read('fuel prices included 5km')
+    df_migrations_augmented = df_migrations_augmented.loc[df_migrations_augmented.year != 2023]
+
+    mask = df_migrations_augmented.uuid_migration.value_counts()
+    df_migrations_augmented = df_migrations_augmented.loc[df_migrations_augmented.uuid_migration.isin(mask.index[mask > 1])]
+    return df_migrations, df_migrations_augmented
+
+
+def beekeepers_per_year(df_origin):
+    """ Number of beekeepers with colonies at a registered location, by year.
+
+    df_origin: stationary apiaries with their census by year
+    """
+    df_origin = pd.concat([df_origin.iloc[:, 0:5], df_origin.loc[:, df_origin.columns.str.contains("_10")]], axis=1)
+    df_origin = df_origin.rename(
+        columns={
+            "CENSUS_2011_10": 2011, "CENSUS_2012_10": 2012,
+            "CENSUS_2013_10": 2013, "CENSUS_2014_10": 2014,
+            "CENSUS_2015_10": 2015, "CENSUS_2016_10": 2016,
+            "CENSUS_2017_10": 2017, "CENSUS_2018_10": 2018,
+            "CENSUS_2019_10": 2019, "CENSUS_2020_10": 2020, 
+            "CENSUS_2021_10": 2021, "CENSUS_2022_10": 2022,
+            "CENSUS_2023_10": 2023
+        }
+    )
+
+    dfdf = df_origin.melt(
+        id_vars=[
+            "KMG_MID",
+            "GMID",
+        ], 
+        value_vars=[
+            2011, 2012, 2013,
+            2014, 2015, 2016,
+            2017, 2018, 2019,
+            2020, 2021, 2022
+        ], 
+        var_name="year", 
+        value_name="census"
+    )
+
+    dfdf = dfdf.dropna(subset="census")   # Remove locations without data on census.
+    dfdf = dfdf.dropna(subset="KMG_MID")  # Remove locations without unique ID.
+    dfdf = dfdf.loc[dfdf.census > 0]      # Remove locations with 0 colonies.
+
+    return dfdf.groupby("year")["KMG_MID"].nunique().to_frame()
+
+
+def migration_stats(df_migrations, df_migrations_augmented, df_origin, store=None):
+    """ Statistics of the migrations.
+
+    store: PartitionStore of the yearly statistics, see partitions.py
+
+    returns dict sheet name -> table of Migration_Stats.xlsx, in the order
+    of the workbook, and dict name -> yearly statistics, see yearly_stats
+    """
+    # Statistics by year; years whose migrations did not change are reused.
+    years = sorted(set(df_migrations.year) | set(df_migrations_augmented.year))
+    partitions = {
+        str(y): (df_migrations.loc[df_migrations.year == y], df_migrations_augmented.loc[df_migrations_augmented.year == y])
+        for y in years}
+    stats_by_year = run_partitions(store, partitions, stats_of_partitions, code_fingerprint(__file__))
+    stats = {name: concat_years([stats_by_year[k][name] for k in partitions]) for name in stats_by_year[str(years[0])]}
+
+    # Get number of colonies in a single migration.
+    # How are the colonies packed for a single migration? This should reveal sizes 
+    # of typical container units and their frequency.
+    df_n_of_colonies_in_package = pd.cut(
+        df_migrations["FAMILY_MOVE"], 
+        bins=np.arange(0, 221, 1)
+    ).value_counts().to_frame(name="Število družin v premiku").reset_index()
+
+    df_n_of_colonies_in_package_augmented = pd.cut(
+        df_migrations_augmented["FAMILY_MOVE"],
+        bins=np.arange(0, 221, 1)
+    ).value_counts().to_frame(name="Number of colonies migrated").reset_index()
+
+    df_movements_per_beekeeper = df_migrations_augmented["travel_distances"].describe().reset_index()
+
+    sheets = {
+        # General data on beekeepers.
+        "Number of beekeepers per year": beekeepers_per_year(df_origin),
+        'Beekeepers that migrated': stats["beekeepers migrated"],
+        'Beekeepers that migrated pruned': stats["beekeepers migrated augmented"],
+        'Small beekprs migrated pruned': stats["beekeepers migrated augmented small"],
+
+        # General data on migrations.
+        'Migrations yearly': stats["migrations"],
+        'Migrations yearly pruned': stats["migrations augmented"],
+        'Migrations yearly pruned-small': stats["migrations augmented small"],
+
+        "Colony migrations yrly": stats["colony migrations"],
+        'Colonies migrated pruned': stats["colony migrations augmented"],
+
+        # General data on weekly migrations yearly.
+        'Weekly migrations, yearly': stats["weekly"],
+        'Weekly migrations pruned yearly': stats["weekly augmented"],
+
+        # Colony packaging in migrations.
+        "Colony packaging": df_n_of_colonies_in_package,
+        "Colony packaging pruned": df_n_of_colonies_in_package_augmented,
+
+        # Distances.
+        "Traveled distances": stats["distances"],
+        "Migrations yearly - small": stats["distances small"],
+        "Travel - descriptive stats": df_movements_per_beekeeper,
+
+        # Fuel and toll.
+        "Costs of transport, fuel, toll": stats["cost total"],
     }
-)
-
-dfdf = df_origin.melt(
-    id_vars=[
-        "KMG_MID",
-        "GMID",
-    ], 
-    value_vars=[
-        2011, 2012, 2013,
-        2014, 2015, 2016,
-        2017, 2018, 2019,
-        2020, 2021, 2022
-    ], 
-    var_name="year", 
-    value_name="census"
-)
-
-dfdf = dfdf.dropna(subset="census")   # Remove locations without data on census.
-dfdf = dfdf.dropna(subset="KMG_MID")  # Remove locations without unique ID.
-dfdf = dfdf.loc[dfdf.census > 0]      # Remove locations with 0 colonies.
-
-df_origin_stats = dfdf.groupby("year")["KMG_MID"].nunique().to_frame()
-
-# Get migrations
-KMG_MID_migrated = df_migrations.groupby('year')["KMG_MID_origin"].nunique().to_frame(name="n_of_migrations")
-KMG_MID_migrated_augmented = df_migrations_augmented.groupby('year')["KMG_MID_origin"].nunique().to_frame(name="n_of_migrations")
-KMG_MID_migrated_augmented_small = df_migrations_augmented.loc[df_migrations_augmented.FAMILY_MOVE < 29].groupby('year')["KMG_MID_origin"].nunique().to_frame(name="n_of_migrations")
-
-
-#################################
-# Draw colony migrations per week
-#################################
-
-# First, we draw for all years, then we do it year by year.
-df_dest0 = (
-    df_migrations_augmented
-    .groupby(by=["week"])["FAMILY_MOVE"]
-    .sum()
-    .to_frame(name="n_of_migrations")
-)
-
-
-all_stats_weekly_migrations = df_dest0
-
-
-df_dest = df_migrations.groupby(by=["year", "week"])["FAMILY_MOVE"].sum()
-df_dest = df_dest.to_frame().reset_index()
-
-all_stats_weekly_migration_yearly = df_dest
-
-df_dest_augmented = df_migrations_augmented.groupby(by=["year", "week"])["FAMILY_MOVE"].sum()
-df_dest_augmented = df_dest_augmented.to_frame().reset_index()
-
-# Figure 4
-grid2 = sns.FacetGrid(
-    df_dest_augmented,
-    col="year",
-    hue="year",
-    palette="tab20c",
-    col_wrap=3,
-    height=1.5,
-    despine=False
-)
-    
-grid2.fig.subplots_adjust(wspace=0, hspace=0)
-grid2.fig.set_size_inches(170/25.4, 170/25.4)
-
-grid2.map(plt.plot, "week", "FAMILY_MOVE", marker="o", ms=2, linewidth=1, color='black')  # Added ms
-grid2.set_ylabels("Colonies migrated", size=LABELSIZE)
-grid2.set_xlabels("Week", size=LABELSIZE)
-grid2.set_titles(size=LABELSIZE)
-grid2.tick_params(axis='both', which='major',labelsize=LABELSIZE)
-
-grid2.fig.savefig(
-    f'{CONFIG["yearly_migration_dynamics"]}.pdf',
-    dpi=600
-)
-
-# Figure 5
-all_stats_weekly_migration_yearly = df_dest
-all_stats_weekly_migration_yearly_augmented = df_dest_augmented
-
-
-# Get number of colonies in a single migration.
-# How are the colonies packed for a single migration? This should reveal sizes 
-# of typical container units and their frequency.
-df_n_of_colonies_in_package = pd.cut(
-    df_migrations["FAMILY_MOVE"], 
-    bins=np.arange(0, 221, 1)
-).value_counts().to_frame(name="Število družin v premiku").reset_index()
-
+    return sheets, stats
 
-df_n_of_colonies_in_package_augmented = pd.cut(
-    df_migrations_augmented["FAMILY_MOVE"],
-    bins=np.arange(0, 221, 1)
-).value_counts().to_frame(name="Number of colonies migrated").reset_index()
 
-f2_1 = plt.figure(
-    figsize=(170/25.4, 65/25.4),
-    dpi=300
-)
+if __name__ == "__main__":
 
-#a20_1 = f2_1.add_axes([0.15, 0.15, 0.8, 0.75])
-a20_1 = f2_1.add_axes([0.15, 0.20, 0.8, 0.70])
+    with open("config.yaml") as f:
+        CONFIG = yaml.load(f, Loader=yaml.FullLoader)
 
-sns.histplot(data=df_migrations_augmented["FAMILY_MOVE"], bins=np.arange(0, 221, 1), ax=a20_1, color="teal")
+    ###########
+    # Load data
+    ###########
+    store = open_store(CONFIG)
+    df_migrations, df_migrations_augmented = load_migrations(store)
 
-a20_1.set_ylabel("No. of migrations", fontsize=LABELSIZE)
-a20_1.set_xlabel("No. of colonies packed in single migration", fontsize=LABELSIZE)
-a20_1.set_title("Colony packaging by migration", fontsize=LABELSIZE)
-a20_1.set_xlim(0, 100)
+    # Number of beekeepers who relocate their colonies.
+    # Get the number of beekeepers registered in particular year.
+    df_origin = pd.read_excel(CONFIG['origins'])
 
-a20_1.tick_params(axis='both', labelsize=LABELSIZE)
-sns.set_style('white')
+    sheets, stats = migration_stats(
+        df_migrations, df_migrations_augmented, df_origin, partition_store(CONFIG, "migrations_stats"))
 
-f2_1.savefig(f'{CONFIG["colony_packaging"]}.pdf')
-
-# Load data about migrations survey.
-survey_fn = CONFIG['survey_results']
-df_survey = pd.read_excel(survey_fn, sheet_name='transport_means')
-
-
-all_stats_colony_packaging = df_n_of_colonies_in_package
-all_stats_colony_packaging_pruned = df_n_of_colonies_in_package_augmented
-
-
-df_movements_yearly = df_migrations_augmented.groupby(
-    df_migrations_augmented.year
-)["travel_distances"].sum().reset_index(name="razdalja [km]")
-
-df_movements_yearly_small = df_migrations_augmented.loc[
-    df_migrations_augmented.FAMILY_MOVE < 29
-].groupby(df_migrations_augmented.year)["travel_distances"].sum().reset_index(name="razdalja [km]")
-
-df_movements_per_beekeeper = df_migrations_augmented["travel_distances"].describe().reset_index()
-
-# Figure 6
-sns.set_style("white")
-
-f6 = plt.figure(figsize=(170/25.4, 85/25.4), dpi=600)
-#a60 = f6.add_axes([0.15, 0.15, 0.68, 0.75])
-a60 = f6.add_axes([0.15, 0.20, 0.68, 0.75])
-a60_twin = a60.twinx()
-
-sns.barplot(df_movements_yearly, x="year", y="razdalja [km]", color="teal", ax=a60)
-sns.barplot(df_movements_yearly_small, x="year", y="razdalja [km]", color="black", ax=a60_twin)
-
-a60.set_ylabel("Cumulative travel distance [km]", fontsize=LABELSIZE, color="teal")
-a60_twin.set_ylabel("Cumulative travel distance\n by small beekeepers [km]", fontsize=LABELSIZE)
-a60.set_xlabel("Year", fontsize=LABELSIZE)
-
-a60.tick_params(axis='both', which='major', labelsize=LABELSIZE)
-a60.tick_params(axis='y', color="teal", labelcolor="teal")
-a60_twin.tick_params(axis='both', which='major', labelsize=LABELSIZE)
-a60_twin.set_ylim(a60.get_ylim())
-
-sns.set_style('white')
-
-f6.savefig(f'{CONFIG["yearly_distances_traveled_cumulative"]}.pdf')
-
-
-all_stats_migration_distances_yearly = df_movements_yearly
-all_stats_migration_distances_yearly_small = df_movements_yearly_small
-all_stats_migrations_distances_per_beekeper = df_movements_per_beekeeper
-
-############################################
-# Obtain general beekeeping and apiary stats
-############################################
-
-# Calculate fuel consumption and toll expenditures in a given year.
-df_fuel = df_migrations_augmented.groupby('year')["fuel paid"].sum().reset_index()
-df_migrations_augmented["toll Euro 0 - 2"] = df_migrations_augmented["motorway"]*df_migrations_augmented["Euro 0 - 2"]
-df_toll_euro0_2 = df_migrations_augmented.groupby('year')["toll Euro 0 - 2"].sum().reset_index()
-df_migrations_augmented["toll Euro 6, EEV"] = df_migrations_augmented["motorway"]*df_migrations_augmented["Euro 6, EEV"]
-df_toll_euro6 = df_migrations_augmented.groupby('year')["toll Euro 6, EEV"].sum().reset_index()
-df_cost_euro0 = df_fuel["fuel paid"] + df_toll_euro0_2["toll Euro 0 - 2"]
-df_cost_euro6 = df_fuel["fuel paid"] + df_toll_euro6["toll Euro 6, EEV"]
-df_cost_total = pd.DataFrame(
-    {
-        "year": df_fuel["year"],
-        "fuel costs only": df_fuel["fuel paid"],
-        "total cost Euro 0 - 2": df_cost_euro0, 
-        "total cost Euro 6, EEV": df_cost_euro6
-    }
-)
-
-# Figure 9
-# Plot yearly costs of fuel and toll.
-f_fuel = plt.figure(figsize=(170/25.4, 85/25.4), dpi=600)
-a_fuel = f_fuel.add_axes((0.15, 0.20, 0.80, 0.70))
-sns.set_style('white')
-sns.barplot(data=df_cost_total, x="year", y="total cost Euro 0 - 2", color="darkgrey", ax=a_fuel, label="toll Euro 0 - 2")
-sns.barplot(data=df_cost_total, x="year", y="total cost Euro 6, EEV", color="lightgrey", ax=a_fuel, label="toll Euro 6, EEV")
-sns.barplot(data=df_fuel, x="year", y="fuel paid", ax=a_fuel, color="teal", label="fuel")
-a_fuel.set_ylabel('Yearly costs of hive transport in €', fontsize=LABELSIZE)
-a_fuel.set_xlabel('Year', fontsize=LABELSIZE)
-a_fuel.tick_params(axis='both', which='major', labelsize=LABELSIZE)
-
-a_fuel.legend(
-    fontsize=LABELSIZE,
-    ncol=3,
-    bbox_to_anchor=(0.5, 1.075),
-    loc='center'
-)
-
-sns.set_style('white')
-f_fuel.savefig(f'{CONFIG["yearly_costs_fig"]}.pdf')
-
-
-# Figure 7
-# Plot travel times.
-df_traveled_distances = (
-    pd.cut(
-        df_migrations_augmented["travel_distances"], 
-        bins=np.arange(0, 300, 5))
-    .value_counts()
-    .to_frame(name="Kilometers traveled")
-    .reset_index()
-)
-
-df_traveled_motorway = (
-    pd.cut(
-        df_migrations_augmented["motorway"], 
-        bins=np.arange(0, 300, 5))
-    .value_counts()
-    .to_frame(name="Kilometers on motorway")
-    .reset_index()
-)
-
-df_traveled_distances = (
-    pd.cut(
-        df_migrations_augmented["travel_time"], 
-        bins=np.arange(0, 300, 5))
-    .value_counts()
-    .to_frame(name="Kilometers traveled")
-    .reset_index()
-)
-
-f_traveled_distances = plt.figure(figsize=(170/25.4, 89/25.4), dpi=600)
-#a_traveled_distances = f_traveled_distances.add_axes((0.15, 0.15, 0.80, 0.75))
-a_traveled_distances = f_traveled_distances.add_axes((0.15, 0.20, 0.80, 0.70))
-
-sns.set_style('white')
-sns.histplot(data=df_migrations_augmented["travel_time"], bins=np.arange(0, 300, 5), ax=a_traveled_distances, color="teal")
-a_traveled_distances.set_xlabel("Travel times within single migration [minutes]", fontsize=LABELSIZE)
-a_traveled_distances.set_ylabel("Count", fontsize=LABELSIZE)
-#a_traveled_distances.tick_params(axis='both', labelsize=LABELSIZE)
-f_traveled_distances.savefig(f'{CONFIG["travel_time_fig"]}.pdf')
-
-
-############
-# Save stats
-############
-
-writer = pd.ExcelWriter(CONFIG['migration_stats'])
-
-# General data on beekeepers.
-df_origin_stats.to_excel(writer, sheet_name="Number of beekeepers per year")
-KMG_MID_migrated.to_excel(writer, sheet_name='Beekeepers that migrated')
-KMG_MID_migrated_augmented.to_excel(writer, sheet_name='Beekeepers that migrated pruned')
-KMG_MID_migrated_augmented_small.to_excel(writer, sheet_name='Small beekprs migrated pruned')
-
-# General data on migrations.
-all_stats_migrations_yearly.to_excel(writer, sheet_name='Migrations yearly')
-all_stats_migrations_yearly_augmented.to_excel(writer, sheet_name='Migrations yearly pruned')
-all_stats_migrations_yearly_augmented_small.to_excel(writer, sheet_name='Migrations yearly pruned-small')
-
-all_stats_migrations_colony_yearly.to_excel(writer, sheet_name="Colony migrations yrly")
-all_stats_migrations_colony_yearly_augmented.to_excel(writer, sheet_name='Colonies migrated pruned')
-
-# General data on weekly migrations yearly.
-all_stats_weekly_migration_yearly.to_excel(writer, sheet_name='Weekly migrations, yearly')
-all_stats_weekly_migration_yearly_augmented.to_excel(writer, sheet_name='Weekly migrations pruned yearly')
-
-# Colony packaging in migrations.
-all_stats_colony_packaging.to_excel(writer, sheet_name="Colony packaging")
-all_stats_colony_packaging_pruned.to_excel(writer, sheet_name="Colony packaging pruned")
-
-# Distances.
-all_stats_migration_distances_yearly.to_excel(writer, sheet_name="Traveled distances")
-all_stats_migration_distances_yearly_small.to_excel(writer, sheet_name="Migrations yearly - small")
-all_stats_migrations_distances_per_beekeper.to_excel(writer, sheet_name="Travel - descriptive stats")
-
-# Fuel and toll.
-df_cost_total.to_excel(writer, sheet_name="Costs of transport, fuel, toll")
-
-writer.close()
+    ############
+    # Save stats
+    ############
+    with pd.ExcelWriter(CONFIG['migration_stats']) as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name)
 
+    # Tables of the figures, see migrations_figures.py.
+    figure_tables = {"stats " + name: stats[name] for name in FIGURE_TABLES}
+    figure_tables["stats moves"] = df_migrations_augmented[FIGURE_MOVES]
+    store.write(figure_tables)
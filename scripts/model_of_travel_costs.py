@@ -3,16 +3,10 @@
 
 """
 import yaml
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-from utils import decay_exp2, rise_exp2, linear, r_square, unp_decay_exp2, unp_rise_exp2
-from scipy.optimize import curve_fit, minimize
-import uncertainties as unc
-import uncertainties.unumpy as unp
-from RegscorePy import aic
-from lmfit import Model
-import seaborn as sns
+from utils import linear, linear_unc
+from storage import open_store
 
 LABELSIZE = 12  # Default fontsize for images.
 
@@ -20,32 +14,34 @@ __author__ = "jpresern"
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     with open('config.yaml') as f:
         CONFIG = yaml.load(f, Loader=yaml.FullLoader)
     
     # Fuel consumption calibration params.
-    fuel_calib = CONFIG["fuel_calibrations"]
-    df_consumption = pd.read_excel(fuel_calib, sheet_name='fuel_calibration')
+    store = open_store(CONFIG)
+    df_consumption = store.read('fuel_calibration')
 
     # Honey data.
     survey_results = CONFIG["survey_results"]
     honey_money_df = pd.read_excel(survey_results, sheet_name='honey_prices')
 
     # Cost data.
-    migrations_fn = CONFIG["migrations_processed"]
-    df_migrations = pd.read_excel(migrations_fn, sheet_name='fuel prices included 5km')
+    df_migrations = store.read('fuel prices included 5km')
 
     # Generate travel data.
     travel = np.arange(0, 600, 20)
 
     # Premise 1: traveling with personal car with 10 hives.
     fuel_10_hives = linear(10, df_consumption.loc[0, "k_linear"], df_consumption.loc[0, "intercept_linear"])
-    fuel_10_hives_unc = linear(10, df_consumption.loc[0, "k_unc_lin"], df_consumption.loc[0, "intercept_unc_lin"])
+    fuel_10_hives_unc = linear_unc(10, *df_consumption.loc[0, ["k_linear", "intercept_linear", "var_k_lin", "cov_k_intercept_lin", "var_intercept_lin"]])
     fuel_10_df = pd.DataFrame({"Distance": travel, "Fuel consumption": travel*fuel_10_hives})
 
     # Premise 2: traveling with personal car with 20 hives in 2022.
     fuel_20_hives = linear(20, df_consumption.loc[0, "k_linear"], df_consumption.loc[0, "intercept_linear"])
-    fuel_20_hives_unc = linear(20, df_consumption.loc[0, "k_unc_lin"], df_consumption.loc[0, "intercept_unc_lin"])
+    fuel_20_hives_unc = linear_unc(20, *df_consumption.loc[0, ["k_linear", "intercept_linear", "var_k_lin", "cov_k_intercept_lin", "var_intercept_lin"]])
     cost_20_df = pd.DataFrame({"Distance": travel, "Fuel consumption": travel * fuel_20_hives})
 
         
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Incremental recomputation of pipeline stages, partition by partition.
+
+A stage splits its input into partitions (a year, or a cutoff and a year) and
+stores the output of every partition together with a fingerprint of the
+partition input and of the settings the stage depends on. On the next run
+only partitions whose fingerprint changed are recomputed, so adding a season
+costs about one year of work:
+
+    store/
+        manifest.json    partition -> fingerprint
+        <partition>.pkl  output of the partition
+
+Stages add code_fingerprint of their script to the settings, so changing
+the script or a local module it imports recomputes every partition.
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import ast
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+
+def frame_fingerprint(df):
+    """ sha1 of the columns, dtypes and values of a frame; the index is ignored,
+    so a partition keeps its fingerprint when rows of other partitions change. """
+    digest = hashlib.sha1()
+    digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def fingerprint(*parts):
+    """ sha1 of frames (see frame_fingerprint), lists of them and json
+    serializable settings. """
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            digest.update(frame_fingerprint(part).encode())
+        elif isinstance(part, (list, tuple)):
+            digest.update(fingerprint(*part).encode())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def source_files(script):
+    """ script and the local modules (.py files in its directory) it imports,
+    directly or through other local modules, including imports within
+    functions; sorted paths. """
+    directory = os.path.dirname(os.path.abspath(script))
+    files, pending = set(), [os.path.abspath(script)]
+    while pending:
+        fn = pending.pop()
+        if fn in files:
+            continue
+        files.add(fn)
+        with open(fn) as f:
+            tree = ast.parse(f.read(), fn)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module = os.path.join(directory, name.split(".")[0] + ".py")
+                if os.path.exists(module):
+                    pending.append(module)
+    return sorted(files)
+
+
+def code_fingerprint(script):
+    """ sha1 of the names and sources of script and of the local modules it
+    imports, see source_files. """
+    digest = hashlib.sha1()
+    for fn in source_files(script):
+        digest.update(os.path.basename(fn).encode())
+        with open(fn, "rb") as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
+
+
+class PartitionStore:
+    """ Outputs of the partitions of a stage, keyed by partition name.
+
+    :param path: store directory, created if missing
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._manifest_fn = os.path.join(path, "manifest.json")
+        self.manifest = {}
+        if os.path.exists(self._manifest_fn):
+            with open(self._manifest_fn) as f:
+                self.manifest = json.load(f)
+
+    def _fn(self, key):
+        return os.path.join(self.path, str(key) + ".pkl")
+
+    def get(self, key, fingerprint):
+        """ Stored output of a partition, None if missing or out of date. """
+        if self.manifest.get(str(key)) != fingerprint or not os.path.exists(self._fn(key)):
+            return None
+        return pd.read_pickle(self._fn(key))
+
+    def put(self, key, fingerprint, output):
+        """ Store the output of a partition, a frame or a dict of frames. """
+        pd.to_pickle(output, self._fn(key))
+        self.manifest[str(key)] = fingerprint
+        self._write_manifest()
+
+    def keep(self, keys):
+        """ Remove partitions other than keys, e.g. years no longer in the data. """
+        keys = {str(k) for k in keys}
+        for key in [k for k in self.manifest if k not in keys]:
+            del self.manifest[key]
+            if os.path.exists(self._fn(key)):
+                os.remove(self._fn(key))
+        self._write_manifest()
+
+    def _write_manifest(self):
+        # Replace atomically, a crash leaves the previous manifest.
+        with open(self._manifest_fn + ".tmp", "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(self._manifest_fn + ".tmp", self._manifest_fn)
+
+
+def run_partitions(store, inputs, compute, settings=None, complete=None):
+    """ Outputs of all partitions, recomputing only those that changed.
+
+    :param store: PartitionStore of the stage, None recomputes everything
+    :param inputs: dict partition key -> input, a frame or a tuple of frames
+    :param compute: function of a dict key -> input of the partitions to
+        recompute, all at once, returning a dict key -> output
+    :param settings: frames and settings every partition depends on, e.g.
+        config values or tariff tables
+    :param complete: function of key and output, False keeps the output out
+        of the store so the next run computes the partition again, e.g. after
+        transient failures; None stores every output
+    :return: dict key -> output, in the order of inputs
+    """
+    fingerprints = {}
+    outputs = {}
+    for key, partition in inputs.items():
+        parts = partition if isinstance(partition, tuple) else (partition,)
+        fingerprints[key] = fingerprint(settings, *parts)
+        if store is not None:
+            output = store.get(key, fingerprints[key])
+            if output is not None:
+                outputs[key] = output
+
+    stale = {key: partition for key, partition in inputs.items() if key not in outputs}
+    print("Partitions: ", len(inputs), " recomputed: ", len(stale), " ", list(stale))
+    if stale:
+        for key, output in compute(stale).items():
+            outputs[key] = output
+            if store is not None and (complete is None or complete(key, output)):
+                store.put(key, fingerprints[key], output)
+
+    if store is not None:
+        store.keep(inputs)
+    return {key: outputs[key] for key in inputs}
+
+
+def partition_store(config, stage):
+    """ PartitionStore of a stage under config['partitions'], None if the key
+    is empty or missing, which disables incremental recomputation. """
+    if not config.get('partitions'):
+        return None
+    return PartitionStore(os.path.join(config['partitions'], stage))
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Runs the pre-processing and processing stages, replacing the sequence of
+python calls in main.sh.
+
+Every stage declares the tables (see storage.py) and files it reads and
+writes. Stages run in dependency order within one process, sharing imports
+and passing tables in memory. Stages that are ready at the same time, e.g.
+model_of_travel_costs and migrations_stats, run concurrently in forked
+processes. A stage is skipped when its outputs exist and its inputs, code
+(the script and the local modules it imports) and settings did not change
+since its last run; with intermediate_format excel all tables share one
+workbook, so stages are rarely skipped. A timing summary is printed at the
+end.
+
+    python pipeline.py                # run what is out of date
+    python pipeline.py --force        # run everything
+    python pipeline.py --stages migrations_stats --dry-run
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import runpy
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+import storage
+from migrations_stats import STORED_TABLES
+from partitions import code_fingerprint
+
+
+class Stage:
+    """ A script of the pipeline.
+
+    :param name: stage name, the script is <name>.py
+    :param inputs: tables read
+    :param outputs: tables written
+    :param files: config keys of files read
+    :param products: config keys of files written, e.g. Excel deliverables
+    :param settings: config keys the output depends on
+    """
+
+    def __init__(self, name, inputs=(), outputs=(), files=(), products=(), settings=()):
+        self.name = name
+        self.script = name + ".py"
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.files = list(files)
+        self.products = list(products)
+        self.settings = list(settings)
+
+
+STAGES = [
+    Stage(
+        "preprocessing_1",
+        inputs=["migrations pruned"],
+        outputs=["CBZ back migrations appended_0", "CBZ back migrations appended_3", "CBZ back migrations appended_5"],
+        settings=["migration_ids"]),
+    Stage(
+        "preprocessing_2",
+        inputs=["CBZ back migrations appended_5", "CBZ back migrations appended_0"],
+        outputs=["migrations distances_5 cutoff", "migrations distances_0 cutoff", "Failed_5"],
+        files=["custom_model"],
+        settings=["route_geometry_tolerance", "route_symmetric"]),
+    Stage(
+        "migrations_fuel_calculations",
+        inputs=["migrations distances_5 cutoff"],
+        outputs=["fuel prices included 5km", "fuel_calibration", "fuel model comparison", "fuel consumption intervals",
+                 "cost quantiles", "yearly cost quantiles"],
+        files=["survey_results", "fuel_prices"],
+        settings=["calibration_intervals", "calibration_resamples", "calibration_seed", "calibration_level",
+                  "cost_samples", "cost_seed", "cost_price_cv", "cost_distance_cv", "cost_quantiles"]),
+    Stage(
+        "model_of_travel_costs",
+        inputs=["fuel_calibration", "fuel prices included 5km"],
+        files=["survey_results"],
+        products=["migrations_travel_costs"]),
+    Stage(
+        "migrations_stats",
+        inputs=["CBZ back migrations appended_0", "fuel prices included 5km"],
+        outputs=STORED_TABLES,
+        files=["origins"],
+        products=["migration_stats"]),
+    Stage(
+        "migrations_figures",
+        inputs=STORED_TABLES,
+        settings=["figures"]),
+]
+
+
+def file_stamp(path):
+    """ [path, size, modification time] of a file, None if it is missing. """
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [path, stat.st_size, stat.st_mtime_ns]
+
+
+def stage_fingerprint(stage, config, store):
+    """ sha1 of the code (see partitions.code_fingerprint), settings and the
+    stamps of the inputs of a stage. """
+    parts = {
+        "code": code_fingerprint(stage.script),
+        "settings": {key: config.get(key) for key in stage.settings},
+        "inputs": {name: file_stamp(store.location(name)) if name in store else None for name in stage.inputs},
+        "files": {key: file_stamp(config.get(key)) for key in stage.files}}
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def up_to_date(stage, config, store, state):
+    """ Whether the outputs of a stage exist and it ran on the current inputs. """
+    outputs = all(name in store for name in stage.outputs) and all(
+        config.get(key) and os.path.exists(config[key]) for key in stage.products)
+    return outputs and state.get(stage.name) == stage_fingerprint(stage, config, store)
+
+
+def dependencies(stages):
+    """ dict stage name -> names of the stages writing its inputs. """
+    writers = {name: stage.name for stage in stages for name in stage.outputs}
+    return {stage.name: {writers[name] for name in stage.inputs if name in writers} for stage in stages}
+
+
+def run_stage(stage):
+    """ Run the script of a stage as __main__ and return its duration [s]. """
+    start = time.perf_counter()
+    runpy.run_path(stage.script, run_name="__main__")
+    return time.perf_counter() - start
+
+
+def run_pipeline(config, stages=STAGES, selected=None, force=False, jobs=2, dry_run=False, state_fn=None):
+    """ Run the stages that are out of date, in dependency order.
+
+    :param config: parsed config.yaml
+    :param selected: names of the stages to consider, all if None; the
+        others are treated as done
+    :param force: run selected stages even if they are up to date
+    :param jobs: maximal number of stages running at the same time
+    :param dry_run: only report what would run
+    :param state_fn: json file of the fingerprints of the last runs
+    :return: list of (stage name, status, seconds)
+    """
+    store = storage.MemoryStore(storage.open_store(config))
+    storage.share_store(store)
+
+    state = {}
+    if state_fn and os.path.exists(state_fn):
+        with open(state_fn) as f:
+            state = json.load(f)
+
+    requires = dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    pending = [stage.name for stage in stages if selected is None or stage.name in selected]
+    done = {stage.name for stage in stages} - set(pending)
+    ran = set()  # Stages that ran, or would run; everything after them runs too.
+    summary = []
+
+    try:
+        while pending:
+            ready = [name for name in pending if requires[name] <= done]
+            if not ready:
+                raise RuntimeError("Circular stage dependencies: " + ", ".join(pending))
+
+            wave = []
+            for name in ready:
+                pending.remove(name)
+                if not force and not requires[name] & ran and up_to_date(by_name[name], config, store, state):
+                    summary.append((name, "up to date", 0.0))
+                    done.add(name)
+                elif dry_run:
+                    summary.append((name, "would run", 0.0))
+                    done.add(name)
+                    ran.add(name)
+                else:
+                    wave.append(by_name[name])
+            if not wave:
+                continue
+
+            print("Running: ", ", ".join(stage.name for stage in wave))
+            if len(wave) == 1 or jobs <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+                durations = [run_stage(stage) for stage in wave]
+            else:
+                # Forked workers inherit the imports and the tables in memory.
+                with ProcessPoolExecutor(max_workers=min(jobs, len(wave)), mp_context=multiprocessing.get_context("fork")) as pool:
+                    durations = list(pool.map(run_stage, wave))
+
+            for stage, seconds in zip(wave, durations):
+                summary.append((stage.name, "ran", seconds))
+                state[stage.name] = stage_fingerprint(stage, config, store)
+                done.add(stage.name)
+                ran.add(stage.name)
+            if state_fn:
+                with open(state_fn, "w") as f:
+                    json.dump(state, f, indent=1, sort_keys=True)
+    finally:
+        storage.share_store(None)
+
+    return summary
+
+
+def print_summary(summary, wall=None):
+    """ Per-stage timing table; wall is the elapsed time of the whole run [s],
+    less than the total when stages ran concurrently. """
+    print(f"\n{'stage':<32}{'status':<14}{'seconds':>10}")
+    for name, status, seconds in summary:
+        print(f"{name:<32}{status:<14}{seconds:>10.1f}")
+    print(f"{'total':<46}{sum(s for _, _, s in summary):>10.1f}")
+    if wall is not None:
+        print(f"{'wall time':<46}{wall:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=[stage.name for stage in STAGES], help="stages to run, default all")
+    parser.add_argument("--force", action="store_true", help="run stages even if they are up to date")
+    parser.add_argument("--jobs", type=int, default=2, help="maximal number of stages running at the same time")
+    parser.add_argument("--dry-run", action="store_true", help="only list the stages that would run")
+    args = parser.parse_args()
+
+    # Stages read config.yaml and their scripts relative to this directory.
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    with open("config.yaml") as f:
+        CONFIG = yaml.load(f, Loader=yaml.FullLoader)
+
+    # Figures are only saved, never shown.
+    import matplotlib
+    matplotlib.use("Agg")
+
+    start = time.perf_counter()
+    summary = run_pipeline(
+        CONFIG, selected=args.stages, force=args.force, jobs=args.jobs, dry_run=args.dry_run,
+        state_fn=CONFIG.get('pipeline_state'))
+    print_summary(summary, time.perf_counter() - start)
@@ -15,259 +15,332 @@ __author__ = "janez presern, anja pavlin, andraz marinc"
 
 
 import yaml
-import matplotlib.pyplot as plt
 import pandas as pd
 import uuid
+from bisect import bisect_right
 from datetime import timedelta
 import numpy as np
 import warnings
-from preprocessing_2 import get_the_distance
-import seaborn as sns
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from partitions import code_fingerprint, partition_store, run_partitions
+from storage import open_store
 
 
+""" namespace of the content derived migration ids, see migration_ids """
+MIGRATION_NAMESPACE = uuid.UUID("6f1c2b7e-3a5d-5e8f-9b40-2d7c1e0a4f93")
 
 
 
-def add_CBZ_back_trip(uuids, t_df):
-    """ 
-    t_df: temp_df
-    uuuids: list of uids on that particular trip
-    
-    function that generates the back trip
-    first check if a single trip is in the question
 
-    returns generated trip and amended uuids list
+def index_origins(gmid_origin):
+    """ Index of onward moves.
+
+    :param gmid_origin: GMID_origin of every move, in row order
+    :return: dict GMID_origin -> sorted row positions of the moves leaving it
+    """
+    index = {}
+    for position, gmid in enumerate(gmid_origin):
+        if gmid == gmid:  # nan never matches a destination
+            index.setdefault(gmid, []).append(position)
+    return index
+
+
+def next_move(index, gmid, after):
+    """ Row position of the first move leaving gmid after row position `after`,
+    -1 if there is none. """
+    positions = index.get(gmid)
+    if positions is None:
+        return -1
+    k = bisect_right(positions, after)
+    return positions[k] if k < len(positions) else -1
+
+
+def link_chains(gmid_origin, gmid_dest, starts):
+    """ Chain moves into migrations.
+
+    Every start move that is not part of an earlier chain begins a new chain,
+    which continues with the first later move leaving the destination of the
+    previous one, until no such move exists. Moves already used in a chain can
+    still continue another chain; only starts are skipped once used.
+
+    :param gmid_origin: GMID_origin of every move, in row order
+    :param gmid_dest: GMID_dest of every move, in row order
+    :param starts: row positions of moves from stationary apiaries, ascending
+    :return: list of chains (lists of row positions) and flag array, 1 for
+        every move used in a chain
     """
-    uuid_new = uuid.uuid4().__str__()
-    back_trip = pd.Series()
-    back_trip["uuid"] = uuid_new
-    uuids_ammended = uuids + [uuid_new]
-
-    if len(uuids) == 1:
-
-        u = uuids[0]
-
-        back_trip["GMID_origin"] = t_df.loc[t_df["uuid"] == u]["GMID_dest"].values[0]
-        back_trip["GMID_dest"] = t_df.loc[t_df["uuid"] == u]["GMID_origin"].values[0]
-        back_trip["DATE_MOVE"] = (t_df.loc[t_df["uuid"] == u]["DATE_MOVE"] + timedelta(days=30)).values[0]
-        back_trip["FAMILY_MOVE"] = t_df.loc[t_df["uuid"] == u]["FAMILY_MOVE"].values[0]
-
-        """ coordinates """
-        back_trip["X_COORDINATE"] = t_df.loc[t_df["uuid"] == u]["X_origin"].values[0]
-        back_trip["Y_COORDINATE"] = t_df.loc[t_df["uuid"] == u]["Y_origin"].values[0]
-        back_trip["X_origin"] = t_df.loc[t_df["uuid"] == u]["X_COORDINATE"].values[0]
-        back_trip["Y_origin"] = t_df.loc[t_df["uuid"] == u]["Y_COORDINATE"].values[0]
-        back_trip["dest_long"] = t_df.loc[t_df["uuid"] == u]["origin_long"].values[0]
-        back_trip["dest_lat"] = t_df.loc[t_df["uuid"] == u]["origin_lat"].values[0]
-        back_trip["origin_long"] = t_df.loc[t_df["uuid"] == u]["dest_long"].values[0]
-        back_trip["origin_lat"] = t_df.loc[t_df["uuid"] == u]["dest_lat"].values[0]
-
-        """ date_time """
-        back_trip["year"] = back_trip["DATE_MOVE"].year
-        back_trip["month"] = back_trip["DATE_MOVE"].month
-        back_trip["week"] = back_trip["DATE_MOVE"].isocalendar().week
-        back_trip["DayinYear"] = back_trip["DATE_MOVE"].dayofyear
-
-        """ apiary type, KMG_MID """
-        back_trip["TYPE"] = "CBS"
-        back_trip["TYPE_origin"] = "CBZ"
-        back_trip["KMG_MID_dest"] = t_df.loc[t_df["uuid"] == u]["KMG_MID_origin"].values[0]
-        back_trip["KMG_MID_origin"] = ""
-
-        "flags"
-        back_trip["flag"] = 1
-        back_trip["generated_trip_flag"] = 1
-
-        back_trip = back_trip.to_frame().T
-
-        t_new = pd.concat([t_df.loc[t_df.uuid.isin(uuids)], back_trip], ignore_index=True)
+    index = index_origins(gmid_origin)
+    flags = np.zeros(len(gmid_origin), dtype=np.int64)
+    chains = []
 
-    else:
-        # In this case we need to re-calculate the paths. 
-        #   - the last known CBS/CBP is excluded OR
-        #   - the first known CBS/CBP is excluded
+    for start in starts:
+        if flags[start] == 1:
+            continue
 
-        u = t_df.loc[(t_df.uuid.isin(uuids)) & ((t_df["TYPE_origin"] == "CBS") | (t_df["TYPE_origin"] == "CBP"))]["uuid"].head(n=1).to_list()[0]
-        u_CBZ = uuids[-1]
+        chain = [int(start)]
+        position = next_move(index, gmid_dest[start], start)
+        while position >= 0:
+            chain.append(position)
+            position = next_move(index, gmid_dest[position], position)
 
-        """ set destination: parameters from last move to CBS """
-        back_trip["GMID_origin"] = t_df.loc[t_df["uuid"] == u]["GMID_dest"].values[0]
-        back_trip["GMID_dest"] = t_df.loc[t_df["uuid"] == u]["GMID_origin"].values[0]
-        back_trip["dest_long"] = t_df.loc[t_df["uuid"] == u]["origin_long"].values[0]
-        back_trip["dest_lat"] = t_df.loc[t_df["uuid"] == u]["origin_lat"].values[0]
+        flags[chain] = 1
+        chains.append(chain)
 
-        back_trip["X_COORDINATE"] = t_df.loc[t_df["uuid"] == u]["X_origin"].values[0]
-        back_trip["Y_COORDINATE"] = t_df.loc[t_df["uuid"] == u]["Y_origin"].values[0]
+    return chains, flags
 
-        back_trip["TYPE"] = "CBS"
-        back_trip["TYPE_origin"] = "CBZ"
-        back_trip["KMG_MID_dest"] = t_df.loc[t_df["uuid"] == u]["KMG_MID_origin"].values[0]
-        back_trip["KMG_MID_origin"] = ""
 
-        """ set destination: parameters from the last move to CBZ """
-        back_trip["DATE_MOVE"] = (t_df.loc[t_df["uuid"] == u_CBZ]["DATE_MOVE"] + timedelta(days=30)).values[0]
-        back_trip["FAMILY_MOVE"] = t_df.loc[t_df["uuid"] == u_CBZ]["FAMILY_MOVE"].values[0]
-        back_trip["origin_long"] = t_df.loc[t_df["uuid"] == u_CBZ]["dest_long"].values[0]
-        back_trip["origin_lat"] = t_df.loc[t_df["uuid"] == u_CBZ]["dest_lat"].values[0]
-        back_trip["X_origin"] = t_df.loc[t_df["uuid"] == u_CBZ]["X_COORDINATE"].values[0]
-        back_trip["Y_origin"] = t_df.loc[t_df["uuid"] == u_CBZ]["Y_COORDINATE"].values[0]
+def migration_ids(chains, t_df, ids="content"):
+    """
+    Keys of migrations.
 
-        """ date_time """
-        back_trip["year"] = back_trip["DATE_MOVE"].year
-        back_trip["month"] = back_trip["DATE_MOVE"].month
-        back_trip["week"] = back_trip["DATE_MOVE"].isocalendar().week
-        back_trip["DayinYear"] = back_trip["DATE_MOVE"].dayofyear
+    With ids="content" the key is a uuid5 of the uuids and dates of the member
+    moves, so a migration keeps its key between runs as long as its moves do
+    not change. ids="random" gives a new uuid4 on every run.
 
-        back_trip = back_trip.to_frame().T
+    t_df: temp_df
+    chains: list of chains (row positions in t_df)
 
+    returns list of key strings, one per chain
+    """
+    if ids == "random":
+        return [uuid.uuid4().__str__() for _ in chains]
+    if ids != "content":
+        raise ValueError("Unknown migration ids: " + str(ids))
 
-        "flags"
-        back_trip["flag"] = 1
-        back_trip["generated_trip_flag"] = 1
+    moves = (t_df["uuid"].astype(str) + "@" + t_df["DATE_MOVE"].astype(str)).values
+    return [uuid.uuid5(MIGRATION_NAMESPACE, "|".join(moves[chain])).__str__() for chain in chains]
 
-        t_new = pd.concat([t_df.loc[t_df.uuid.isin(uuids)], back_trip], ignore_index=True)
 
-    """ add key to single out migrations belonging together """
-    t_new["uuid_migration"] = uuid.uuid4().__str__()
+def add_CBZ_back_trips(chains, t_df, uuids=None):
+    """
+    Generate the missing back trips (CBZ ---> CBS) of chains ending in a
+    temporary apiary, all chains at once.
 
-    return uuids_ammended, t_new
+    The back trip returns from the destination of the last move (CBZ) to the
+    origin of the first move (CBS/CBP), 30 days after the last move:
+        - GMIDs, destination coordinates and KMG_MID from the first move
+        - date, colonies and origin coordinates from the last move
 
-    pass
+    t_df: temp_df
+    chains: list of chains (row positions in t_df) ending in CBZ
+    uuids: uuids of the back trips, new uuid4s if None
 
+    returns df of back trips, one per chain, with the columns of t_df
+    """
+    # Chains start with a move from CBS/CBP, see link_chains.
+    first = t_df.iloc[[chain[0] for chain in chains]]
+    last = t_df.iloc[[chain[-1] for chain in chains]]
+    date = pd.DatetimeIndex(last["DATE_MOVE"].values + np.timedelta64(30, "D"))
+
+    back_trips = {
+        "uuid": [uuid.uuid4().__str__() for _ in chains] if uuids is None else list(uuids),
+
+        # set destination: parameters from first move from CBS
+        "GMID_origin": first["GMID_dest"].values,
+        "GMID_dest": first["GMID_origin"].values,
+        "dest_long": first["origin_long"].values,
+        "dest_lat": first["origin_lat"].values,
+        "X_COORDINATE": first["X_origin"].values,
+        "Y_COORDINATE": first["Y_origin"].values,
+
+        # apiary type, KMG_MID
+        "TYPE": "CBS",
+        "TYPE_origin": "CBZ",
+        "KMG_MID_dest": first["KMG_MID_origin"].values,
+        "KMG_MID_origin": "",
+
+        # set origin: parameters from the last move to CBZ
+        "DATE_MOVE": date,
+        "FAMILY_MOVE": last["FAMILY_MOVE"].values,
+        "origin_long": last["dest_long"].values,
+        "origin_lat": last["dest_lat"].values,
+        "X_origin": last["X_COORDINATE"].values,
+        "Y_origin": last["Y_COORDINATE"].values,
+
+        # date_time
+        "year": date.year,
+        "month": date.month,
+        "week": date.isocalendar().week.values.astype(np.int64),
+        "DayinYear": date.dayofyear,
+
+        # flags
+        "flag": 1,
+        "generated_trip_flag": 1,
+    }
+    back_trips = pd.DataFrame(back_trips, index=range(len(chains)))
+
+    """ columns not set are missing, with the dtypes of t_df that hold NA """
+    for column in t_df.columns.difference(back_trips.columns, sort=False):
+        back_trips[column] = t_df[column].iloc[:0].reindex(back_trips.index)
+    back_trips = back_trips[t_df.columns]
+
+    return back_trips
+
+
+def select_moves(df_migrations, year, gap):
+    """ Moves of a year with air distance of at least gap km, in the row order
+    of df_migrations. For gap > 0, moves of fewer than 8 colonies are dropped. """
+    temp_df = df_migrations.loc[(df_migrations["year"] == year) & (df_migrations["air_distance"] >= gap)].copy()
+
+    if gap != 0:
+        """ trying to remove remove migrations shorter than 8 km and those that are migrated to anotehr KMG-MID. Move to another KMG-MID could be purchase; however, no proofs given """
+
+        """ trying to remove remove migrations shorter than 8 km only """
+        temp_df = temp_df.loc[(temp_df["FAMILY_MOVE"] >= 8)]
+
+    return temp_df
+
+
+def build_migrations(temp_df, ids="content"):
+    """
+    Chain the moves of one year into migrations and append the missing back
+    trips of chains ending in CBZ.
 
-if __name__ == "__main__":
-    with open("config.yaml") as f:
-        CONFIG = yaml.load(f, Loader=yaml.FullLoader)
+    Chains are kept as flat integer arrays (row positions in temp_df and chain
+    ids), so the output frame is materialized once.
 
-    # Load tables.
-    migrations_fn = CONFIG['migrations_processed']
-    df_migrations = pd.read_excel(migrations_fn, sheet_name='migrations pruned')
-    print("Number of movements: ", df_migrations.shape[0])
+    temp_df: moves of one year, see select_moves
+    ids: "content" or "random" keys of migrations and back trips, see migration_ids
 
-    """ get years """
-    years = df_migrations.year.unique().tolist()
+    returns df of migrations: the moves of every chain in chain order, followed
+    by its back trip, with key uuid_migration; and a dict of counts for the
+    summary
+    """
+    """ rows are linked by position, temp_df keeps the row order of df_migrations """
+    stationary_origins = np.flatnonzero(((temp_df["TYPE_origin"] == "CBS") | (temp_df["TYPE_origin"] == "CBP")).values)
 
-    writer = pd.ExcelWriter(migrations_fn, mode='a', engine='openpyxl', if_sheet_exists='replace')
+    """ take a migration and look for possible continuation of migration. Check if migration has been used previously """
+    chains, flags = link_chains(temp_df["GMID_origin"].values, temp_df["GMID_dest"].values, stationary_origins)
 
-    """ set air distances """
-    air_gap = [0, 3, 5]
+    """ set up flags to verify if migration already used in analysis """
+    temp_df["flag"] = flags
+    temp_df["generated_trip_flag"] = 0
 
+    lengths = np.array([len(chain) for chain in chains], dtype=np.int64)
+    positions = np.concatenate(chains).astype(np.int64) if chains else np.zeros(0, dtype=np.int64)
+    chain_ids = np.repeat(np.arange(len(chains)), lengths)
 
-    for gap in air_gap:
+    """ create missing migrations (CBZ --- > CBS) of all chains ending with CBZ at once """
+    ends_in_CBZ = temp_df["TYPE"].values[positions[np.cumsum(lengths) - 1]] == "CBZ"
+    cbz_ids = np.flatnonzero(ends_in_CBZ)
+    migration_uuids = np.array(migration_ids(chains, temp_df, ids), dtype=object)
 
-        """ 
-        prepare empty df
-        df will have
-        1) unique identificator of first move
-        2) list of all sequential moves
-        3) list of flags whether the move was added (CBZ - automatic return) or not 
-        """
-        digest_df = pd.DataFrame()
+    """ a back trip is determined by its migration, so it takes its uuid from the migration key """
+    if ids == "content":
+        back_uuids = [uuid.uuid5(MIGRATION_NAMESPACE, "CBZ back trip|" + key).__str__() for key in migration_uuids[cbz_ids]]
+    else:
+        back_uuids = None
+    back_trips = add_CBZ_back_trips([chains[k] for k in cbz_ids], temp_df, back_uuids)
 
-        """ generate unique id for every migration """
-
-        """ loop over years """
-        """ write the movements into new df """
-        """ create missing migrations (CBZ --- > CBS) """
-        uuid_df = pd.DataFrame(columns=[["year", "sequence"]])
-        uuid_df["sequence"] = uuid_df["sequence"].astype('object')
+    """ moves of every chain followed by its back trip; stable sort keeps the chain order """
+    migrations = pd.concat([temp_df.iloc[positions], back_trips], ignore_index=True)
+    order = np.argsort(np.concatenate([chain_ids, cbz_ids]), kind="stable")
+    migrations = migrations.iloc[order].reset_index(drop=True)
 
-        """ construct new data frame"""
-        new_df = pd.DataFrame()
+    """ add key to single out migrations belonging together """
+    migrations["uuid_migration"] = migration_uuids[np.concatenate([chain_ids, cbz_ids])[order]]
 
-        """ counters """
-        counter_uuid_df = 0
-        counter = 0
+    summary = {
+        "moves": len(temp_df),
+        "chains": len(chains),
+        "multi-move chains": int((lengths > 1).sum()),
+        "longest chain": int(lengths.max()) if len(lengths) else 0,
+        "back trips": len(back_trips)}
+    return migrations, summary
 
-        for y in years:
 
-            """ select years and stationary apiaries only """
-            temp_df = df_migrations.loc[(df_migrations["year"] == y) & (df_migrations["air_distance"] >= gap)].copy()
+""" moves shared read-only with the worker processes, see build_partitions """
+_moves = None
 
-            """ drop fewer than 8 colonies if gap = 0"""
-            if gap != 0:
 
-                """ trying to remove remove migrations shorter than 8 km and those that are migrated to anotehr KMG-MID. Move to another KMG-MID could be purchase; however, no proofs given """
+def _share_moves(df_migrations):
+    global _moves
+    _moves = df_migrations
 
-                """ trying to remove remove migrations shorter than 8 km only """
-                temp_df = temp_df.loc[(temp_df["FAMILY_MOVE"] >= 8)]
 
-            stationary_origins = temp_df.loc[(temp_df["TYPE_origin"] == "CBS") | (temp_df["TYPE_origin"] == "CBP")].index
+def _build_partition(partition, ids="content"):
+    gap, year = partition
+    return build_migrations(select_moves(_moves, year, gap), ids)
 
-            """ set up flags to verify if migration already used in analysis """
-            temp_df["flag"] = 0
-            temp_df["generated_trip_flag"] = 0
 
-            """ take a migration and look for possible continuation of migration. Check if migration has been used previously """
-            for i in stationary_origins:
-                counter_uuid_df += 1
-                row = temp_df.loc[i]
+def build_partitions(df_migrations, partitions, workers=1, ids="content"):
+    """
+    Build the migrations of every (gap, year) partition, see build_migrations.
 
-                """ check if row already used: if so, skip the migration """
-                if (row["flag"] == 1):
-                    continue
+    Partitions are independent and are fanned out to a pool of worker
+    processes. The moves are handed to every worker once, by the pool
+    initializer; where processes are forked they are inherited without
+    pickling.
 
-                else:
+    df_migrations: all moves
+    partitions: list of (gap, year)
+    workers: number of worker processes, 1 builds in this process
+    ids: "content" or "random" keys, see migration_ids
 
-                    """ flags """
-                    uuid_next = []
-                    uuid_old = []
-                    uuid_chain = []
+    returns list of (migrations, summary), in the order of partitions
+    """
+    if workers <= 1 or len(partitions) <= 1:
+        _share_moves(df_migrations)
+        return [_build_partition(partition, ids) for partition in partitions]
 
-                    """ check if there are onward travels from the destination """
-                    if temp_df.loc[(temp_df.GMID_origin== row.GMID_dest) & (temp_df.index > i)].shape[0] > 0:
-                        print("Chaining: more than one move")
-                        uuid_chain.append(row.uuid)
-                        print("\tFirst move: ", row.GMID_origin, " ---> ", row.GMID_dest, " uuid: ", row.uuid)
-                        uuid_next = temp_df.loc[(temp_df.GMID_origin== row.GMID_dest) & (temp_df.index > i)]["uuid"].values[0]
-                        uuid_chain.append (uuid_next)
-                        print("\tNext move: ", row.GMID_dest, " ---> ",
-                              str(temp_df.loc[(temp_df.GMID_origin== row.GMID_dest) & (temp_df.index > i)]["GMID_dest"].values[0]),
-                              " uuid: ", uuid_next)
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=min(workers, len(partitions)), mp_context=multiprocessing.get_context(method),
+                             initializer=_share_moves, initargs=(df_migrations,)) as pool:
+        return list(pool.map(partial(_build_partition, ids=ids), partitions))
 
-                        while uuid_next != uuid_old:
-                            temp_GMID_dest = temp_df.loc[temp_df.uuid == uuid_next]["GMID_dest"].values[0]
-                            i_next = temp_df.loc[temp_df.uuid == uuid_next]["GMID_dest"].index[0]
-                            uuid_old = uuid_next
 
-                            if temp_df.loc[(temp_df.GMID_origin== temp_GMID_dest) & (temp_df.index > i_next)]["uuid"].shape[0] > 0:
-                                uuid_next = temp_df.loc[(temp_df.GMID_origin== temp_GMID_dest) & (temp_df.index > i_next)]["uuid"].values[0]
-                                uuid_chain.append(uuid_next)
-                                print("\tNext move: ", temp_GMID_dest, " ---> ",
-                                      str(temp_df.loc[(temp_df.GMID_origin== temp_GMID_dest) & (temp_df.index > i_next)]["GMID_dest"].values[0]),
-                                      " uuid: ", uuid_next)
-                            else:
-                                continue
+def build_stale_partitions(df_migrations, stale, pairs, workers=1, ids="content", summary=True):
+    """
+    Build the partitions that are out of date, see partitions.run_partitions.
 
-                        """ set row as already used and that records are older than """
-                        temp_df.loc[temp_df.uuid.isin(uuid_chain), "flag"] = 1
+    stale: dict "<gap>_<year>" -> moves of the partition
+    pairs: dict "<gap>_<year>" -> (gap, year) of all partitions
 
-                    else:
-                        print("Only a single move.")
-                        print("\tMove: ", row.GMID_origin, " ---> ", row.GMID_dest, " uuid: ", row.uuid)
-                        uuid_chain.append(row.uuid)
+    returns dict "<gap>_<year>" -> migrations
+    """
+    keys = list(stale)
+    built = build_partitions(df_migrations, [pairs[key] for key in keys], workers, ids)
 
-                        """ set row as already used and that records are older than """
-                        temp_df.loc[temp_df.uuid.isin(uuid_chain), "flag"] = 1
+    if summary:
+        for key, (_, counts) in zip(keys, built):
+            print("Partition ", key, ": ", ", ".join(f"{v} {k}" for k, v in counts.items()))
 
-                    """ check if chain ends with CBZ """
-                    if temp_df.loc[temp_df.uuid == uuid_chain[-1]]["TYPE"].tolist()[0] == "CBZ":
-                        print("Move ends with temporary apiary. Number of moves: ", len(uuid_chain))
-                        counter = counter + 1
+    return {key: migrations for key, (migrations, _) in zip(keys, built)}
 
-                        uuid_chain, new_migration = add_CBZ_back_trip(uuid_chain, temp_df)
-                        pass
 
-                    else:
-                        new_migration = temp_df.loc[temp_df.uuid.isin(uuid_chain)]
+if __name__ == "__main__":
+    with open("config.yaml") as f:
+        CONFIG = yaml.load(f, Loader=yaml.FullLoader)
 
-                        """ add key to single out migrations belonging together """
-                        new_migration["uuid_migration"] = uuid.uuid4().__str__()
+    # Load tables.
+    store = open_store(CONFIG)
+    df_migrations = store.read('migrations pruned')
+    print("Number of movements: ", df_migrations.shape[0])
+
+    """ get years """
+    years = df_migrations.year.unique().tolist()
+
+    """ set air distances """
+    air_gap = [0, 3, 5]
+
+    """ every (gap, year) partition is independent; only partitions with changed moves are rebuilt """
+    pairs = {f"{gap}_{y}": (gap, y) for gap in air_gap for y in years}
+    partitions = {key: select_moves(df_migrations, y, gap) for key, (gap, y) in pairs.items()}
+    build = partial(build_stale_partitions, df_migrations, pairs=pairs, workers=CONFIG['chain_workers'],
+                    ids=CONFIG['migration_ids'], summary=CONFIG['chain_summary'])
+    results = run_partitions(
+        partition_store(CONFIG, "preprocessing_1"), partitions, build, [CONFIG['migration_ids'], code_fingerprint(__file__)])
+
+    tables = {}
+    for gap in air_gap:
 
-                    new_df = pd.concat([new_df, new_migration], ignore_index=True)
-                    print("\nNew DF shape: ", str(new_df.shape))
+        """ write the movements and missing migrations (CBZ --- > CBS) of all years into new df """
+        new_df = pd.concat([results[f"{gap}_{y}"] for y in years], ignore_index=True)
+        print("New DF shape: ", str(new_df.shape))
 
-        new_df.to_excel(writer, sheet_name='CBZ back migrations appended_' + str(gap))
+        tables['CBZ back migrations appended_' + str(gap)] = new_df
     """ measure the number of colonies moved to temporary stands """
 
-    writer.close()
+    store.write(tables, index=True)
@@ -11,91 +11,415 @@ OpenStreetMap + grasshopper is used in queries.
 __author__ = "janez presern, anja pavlin, andraz marinc"
 
 
+import hashlib
+import json
+import os
+import shutil
+import time
+from functools import partial
+
 import yaml
-import matplotlib.pyplot as plt
 import pandas as pd
-import requests
 import numpy as np
+from routing import RoutingClient, route_parameters
+from route_cache import RouteCache, profile_fingerprint
+from route_geometry import rdp, write_geometries, path_coordinates
+from partitions import code_fingerprint, partition_store, run_partitions
+from storage import open_store
 
 
-def distance_by_roadclass(data):
-    """ Parse graphhopper response and calculate distances traveled on each 
+def distance_by_roadclass(responses):
+    """ Parse graphhopper responses and calculate distances traveled on each
     roadtype.
-    
-    :param data: text.json() parsed graphhopper response (via GET api)
-    
+
+    The distance details of all responses are joined with their road class
+    intervals in one pass: segment boundaries of every route are shifted so
+    that routes do not overlap, and the road class of each distance segment
+    is found by a binary search over the road class starts. A distance
+    segment gets a road class if it lies entirely within its interval.
+    Responses are not modified.
+
+    :param responses: list of text.json() parsed graphhopper responses (via
+        GET api)
+    :return: dict of road class -> array of meters, one value per response.
+        Classes absent from a route and failed responses are nan, except
+        motorway, which is 0 for every found route.
+    """
+    n = len(responses)
+    columns = {}  # Road class -> column, in order of appearance.
+    present = []  # (route, column) pairs of classes listed in the route.
+    seg_route, seg_start, seg_stop, seg_dist = [], [], [], []
+    cls_route, cls_start, cls_stop, cls_code = [], [], [], []
+    found = np.zeros(n, dtype=bool)
+
+    for r, data in enumerate(responses):
+        if 'paths' not in data:
+            continue
+        found[r] = True
+        details = data['paths'][0]['details']
+
+        if details['road_class']:
+            starts, stops, classes = zip(*((c[0], c[1], c[2]) for c in details['road_class']))
+            codes = [columns.setdefault(c, len(columns)) for c in classes]
+            cls_route.append(np.full(len(codes), r))
+            cls_start.append(starts)
+            cls_stop.append(stops)
+            cls_code.append(codes)
+            present += [(r, c) for c in set(codes)]
+        present.append((r, columns.setdefault('motorway', len(columns))))  # Ensure value at motorway.
+
+        if details['distance']:
+            starts, stops, distances = zip(*((d[0], d[1], d[2]) for d in details['distance']))
+            seg_route.append(np.full(len(starts), r))
+            seg_start.append(starts)
+            seg_stop.append(stops)
+            seg_dist.append(distances)
+
+    def flat(parts, dtype):
+        return np.concatenate([np.asarray(p, dtype=dtype) for p in parts]) if parts else np.zeros(0, dtype=dtype)
+
+    seg_route, seg_start, seg_stop = flat(seg_route, np.int64), flat(seg_start, np.int64), flat(seg_stop, np.int64)
+    seg_dist = flat(seg_dist, np.float64)
+    cls_route, cls_start, cls_stop = flat(cls_route, np.int64), flat(cls_start, np.int64), flat(cls_stop, np.int64)
+    cls_code = flat(cls_code, np.int64)
+
+    # Shift point indices of every route past the end of the previous one.
+    span = np.zeros(n, dtype=np.int64)
+    np.maximum.at(span, seg_route, seg_stop + 1)
+    np.maximum.at(span, cls_route, cls_stop + 1)
+    offset = np.concatenate([[0], np.cumsum(span)[:-1]])
+    seg_start, seg_stop = seg_start + offset[seg_route], seg_stop + offset[seg_route]
+    cls_start, cls_stop = cls_start + offset[cls_route], cls_stop + offset[cls_route]
+
+    # Interval join: last class interval starting at or before the segment.
+    code = np.full(seg_start.shape, -1, dtype=np.int64)
+    if cls_start.size:
+        idx = np.searchsorted(cls_start, seg_start, side='right') - 1
+        candidate = np.clip(idx, 0, None)
+        inside = (
+            (idx >= 0)
+            & (cls_route[candidate] == seg_route)
+            & (seg_start < cls_stop[candidate])
+            & (seg_stop - 1 >= cls_start[candidate])
+            & (seg_stop - 1 < cls_stop[candidate]))
+        code = np.where(inside, cls_code[candidate], -1)
+
+    if (code < 0).any():
+        default = columns.setdefault('default_road_class', len(columns))
+        code = np.where(code < 0, default, code)
+        present += [(r, default) for r in np.unique(seg_route[code == default])]
+
+    n_columns = len(columns)
+    # float even if there are no segments, e.g. every response failed.
+    distances = np.bincount(seg_route * n_columns + code, weights=seg_dist, minlength=n * n_columns).astype(float)
+    distances = distances.reshape(n, n_columns)
+
+    mask = np.zeros((n, n_columns), dtype=bool)
+    if present:
+        rows, cols = zip(*present)
+        mask[list(rows), list(cols)] = True
+    distances[~mask] = np.nan
+
+    return {name: distances[:, j] for name, j in columns.items()}
+
+
+def move_points(df):
+    """ Coordinates of df packaged for use with get api.
+
+    :param df: moves with origin_lat, origin_long, dest_lat, dest_long columns
+    :return: lists of "lat,long" origin and destination strings
+    """
+    origins = (df.origin_lat.astype(str) + ',' + df.origin_long.astype(str)).tolist()
+    dests = (df.dest_lat.astype(str) + ',' + df.dest_long.astype(str)).tolist()
+    return origins, dests
+
+
+def plan_routes(frames, symmetric=False):
+    """ Collect the unique origin/destination pairs over several tables, so
+    that every pair is routed only once.
+
+    :param frames: list of move tables
+    :param symmetric: route A->B and B->A once, in one direction only. Only
+        valid if the profile has no one-way or turn restrictions that matter.
+    :return: unique origins, unique destinations, and for each frame a tuple
+        (index into the unique pairs, reversed flag) per row
+    """
+    origins, dests = [], []
+    for df in frames:
+        o, d = move_points(df)
+        origins += o
+        dests += d
+    origins = np.array(origins, dtype=object)
+    dests = np.array(dests, dtype=object)
+
+    reverse = np.zeros(len(origins), dtype=bool)
+    if symmetric:
+        reverse = dests < origins
+        origins, dests = np.where(reverse, dests, origins), np.where(reverse, origins, dests)
+
+    codes, uniques = pd.factorize(pd.Series(origins) + '|' + pd.Series(dests))
+    first = np.unique(codes, return_index=True)[1]
+
+    rows = []
+    offsets = np.cumsum([0] + [len(df) for df in frames])
+    for start, stop in zip(offsets[:-1], offsets[1:]):
+        rows.append((codes[start:stop], reverse[start:stop]))
+
+    return origins[first].tolist(), dests[first].tolist(), rows
+
+
+class RouteResults:
+    """ Array-backed accumulator of routing output.
+
+    Columns are preallocated for n moves and filled batch by batch; every
+    response is parsed once. Road class columns are created in the order in
+    which the classes appear. Route geometries are simplified with
+    Ramer-Douglas-Peucker.
+
+    :param n: number of moves
+    :param tolerance: simplification tolerance of the travel points [m], None
+        keeps every point
+    """
+
+    def __init__(self, n, tolerance=None):
+        self.n = n
+        self.tolerance = tolerance
+        self.distance = np.full(n, np.nan)  # km
+        self.time = np.full(n, np.nan)  # minutes
+        self.failed = np.zeros(n, dtype=bool)
+        self.transient = np.zeros(n, dtype=bool)  # Failed for a reason that may go away, see routing.py.
+        self.points = np.empty(n, dtype=object)
+        self.road_classes = {}  # Road class -> column of road_class_km.
+        self.road_class_km = np.full((n, 8), np.nan)
+
+    def _column(self, name):
+        """ Column of a road class, added on first use. """
+        if name not in self.road_classes:
+            self.road_classes[name] = len(self.road_classes)
+            if len(self.road_classes) > self.road_class_km.shape[1]:
+                grown = np.full((self.n, 2 * self.road_class_km.shape[1]), np.nan)
+                grown[:, :self.road_class_km.shape[1]] = self.road_class_km
+                self.road_class_km = grown
+        return self.road_classes[name]
+
+    def add(self, start, responses):
+        """ Parse responses of moves start, start + 1, ... into the columns. """
+        self.update(np.arange(start, start + len(responses)), responses)
+
+    def update(self, rows, responses):
+        """ Parse responses of the moves at rows into the columns, replacing
+        earlier results of these moves. """
+        for i, data in zip(rows, responses):
+            self.failed[i] = 'paths' not in data
+            self.transient[i] = bool(data.get('transient'))
+            if 'paths' in data:
+                path = data['paths'][0]
+                self.distance[i] = np.round(path['distance'] / 1000, 3)
+                self.time[i] = np.round(path['time'] / 1000, 0) / 60  # from miliseconds to seconds to minutes
+                self.points[i] = rdp(path_coordinates(path), self.tolerance)
+            else:
+                self.distance[i] = self.time[i] = np.nan
+                self.points[i] = np.zeros((0, 3))
+
+        self.road_class_km[rows] = np.nan
+        for name, meters in distance_by_roadclass(responses).items():
+            self.road_class_km[rows, self._column(name)] = meters / 1000
+
+    def take(self, index, reverse=None):
+        """ Results of the moves at index; reversed moves get the same distances
+        and the geometry traveled backwards. See plan_routes. """
+        taken = RouteResults(len(index), self.tolerance)
+        taken.distance = self.distance[index]
+        taken.time = self.time[index]
+        taken.failed = self.failed[index]
+        taken.transient = self.transient[index]
+        taken.points = self.points[index]
+        taken.road_classes = dict(self.road_classes)
+        taken.road_class_km = self.road_class_km[index]
+        if reverse is not None:
+            for i in np.flatnonzero(reverse):
+                taken.points[i] = taken.points[i][::-1]
+        return taken
+
+    def save_batch(self, path, start, stop):
+        """ Write moves start:stop to an npz file, atomically. """
+        points = self.points[start:stop]
+        offsets = np.concatenate([[0], np.cumsum([len(p) for p in points])])
+        columns = list(self.road_classes)
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(
+                f, distance=self.distance[start:stop], time=self.time[start:stop],
+                failed=self.failed[start:stop], transient=self.transient[start:stop], road_classes=np.array(columns, dtype=str),
+                road_class_km=self.road_class_km[start:stop, :len(columns)],
+                coordinates=np.concatenate([np.zeros((0, 3))] + [np.reshape(p, (-1, 3)) for p in points]),
+                offsets=offsets)
+        os.replace(path + '.tmp', path)
+
+    def load_batch(self, path, start):
+        """ Read a batch written by save_batch into moves start, start + 1, ... """
+        with np.load(path) as batch:
+            stop = start + len(batch['distance'])
+            self.distance[start:stop] = batch['distance']
+            self.time[start:stop] = batch['time']
+            self.failed[start:stop] = batch['failed']
+            if 'transient' in batch.files:
+                self.transient[start:stop] = batch['transient']
+            for j, name in enumerate(batch['road_classes'].tolist()):
+                self.road_class_km[start:stop, self._column(name)] = batch['road_class_km'][:, j]
+            coordinates, offsets = batch['coordinates'], batch['offsets']
+            for i in range(stop - start):
+                self.points[start + i] = coordinates[offsets[i]:offsets[i + 1]]
+
+    def to_frame(self, index=None):
+        """ Road-class distances, travel distances, times and points as one
+        DataFrame. """
+        frame = pd.DataFrame(
+            self.road_class_km[:, :len(self.road_classes)], columns=list(self.road_classes), index=index)
+        frame["travel_distances"] = self.distance
+        frame["travel_time"] = self.time
+        frame["travel_points"] = self.points
+        return frame
+
+
+def route_in_batches(client, origins, dests, tolerance=None, batch_size=500, checkpoint=None):
+    """ Route all moves batch by batch, with progress and ETA.
+
+    With a checkpoint directory, every completed batch is written to disk and
+    a restarted run only routes the batches that are missing, and the moves
+    of stored batches that failed with transient errors. The checkpoint is
+    discarded if the moves or the tolerance differ from the stored run.
+
+    :param client: RoutingClient
+    :param origins: "lat,long" origin strings
+    :param dests: "lat,long" destination strings
+    :param tolerance: simplification tolerance of the travel points [m]
+    :param batch_size: moves per batch
+    :param checkpoint: checkpoint directory, None to keep results in memory only
+    :return: RouteResults in the order of the moves
     """
-    # Get road class.
-    details = data['paths'][0]['details']
-    road_class_segments = details['road_class']
-
-    for road_segment in details['distance']:
-        road_segment.append('default_road_class')
-        segment_start, segment_stop = road_segment[0], road_segment[1]
-
-        for class_segment in road_class_segments:
-            class_segment_points = range(class_segment[0], class_segment[1])
-
-            if (segment_start in class_segment_points and segment_stop - 1 in class_segment_points):
-                road_segment[3] = class_segment[2]
-
-    road_class_distances = dict.fromkeys([i[2] for i in details['road_class']], 0)
-    for road_segment in details['distance']:
-        road_class_distances[road_segment[3]] += road_segment[2]
-    if not road_class_distances.get('motorway'):  # Ensure value at motorway.
-        road_class_distances['motorway'] = 0
-
-    return pd.DataFrame.from_dict([road_class_distances])
-
-
-def get_the_distance(df, url=None):
-    dist = []
-    dist2 = pd.DataFrame()
-    dist_points = pd.DataFrame(columns=["travel_points"])
-    dist_failed = pd.DataFrame()
-    for i, row in df.iterrows():
-        print("Move number: ", str(i))
-        
-        # Coordinates packaged for use with get api.
-        origin = str(row.origin_lat)+','+str(row.origin_long)
-        dest = str(row.dest_lat)+','+str(row.dest_long)
-
-        parameters_get = {
-                        "profile": "truck2",  # TODO. change this to beekeeper truck.
-                        "point": [origin, dest],
-                        "elevation": "true",
-                        "details": ["road_class", "distance"],
-                        "optimize": "true",
-                        "distance_influence": 0,
-                        "points_encoded": "false", # if false, you get [lon, lat, elevation] form
-                        "debug": "false",
-                        "calc_points": "true",
-                        "ch.disable": "false",
-                        "pass_through": "false"}
-
-
-        # Query graphhopper & parse.
-        text = requests.get(url, params=parameters_get)
-
-        if text.json().__contains__('paths'):
-
-            dist.append(np.round(text.json()['paths'][0]['distance'] / 1000, 3))
-            dist2 = pd.concat([dist2, distance_by_roadclass(text.json())/1000], ignore_index=True)
-
-            dist2.at[i, "travel_distances"] = np.round(text.json()['paths'][0]['distance'] / 1000, 3)
-            dist2.at[i, "travel_time"] = np.round(text.json()['paths'][0]['time'] / 1000, 0) / 60  # from miliseconds to seconds to minutes
-            dist_points.at[i, "travel_points"] = text.json()['paths'][0]['points']['coordinates'][::40] # accepting every 40th travel point
+    n = len(origins)
+    results = RouteResults(n, tolerance)
+
+    if checkpoint is not None:
+        fingerprint = hashlib.sha1(json.dumps(
+            [origins, dests, tolerance, batch_size, client.points_encoded]).encode()).hexdigest()
+        manifest = os.path.join(checkpoint, 'manifest.json')
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                if json.load(f).get('fingerprint') != fingerprint:
+                    shutil.rmtree(checkpoint)
+        os.makedirs(checkpoint, exist_ok=True)
+        with open(manifest, 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'n': n, 'batch_size': batch_size}, f)
+
+    todo = []
+    for start in range(0, n, batch_size):
+        batch_fn = None if checkpoint is None else os.path.join(checkpoint, f'batch_{start:09d}.npz')
+        if batch_fn is not None and os.path.exists(batch_fn):
+            results.load_batch(batch_fn, start)
+
+            # Moves that failed transiently, e.g. while graphhopper restarted, are routed again.
+            stop = min(start + batch_size, n)
+            rows = start + np.flatnonzero(results.transient[start:stop])
+            if rows.size:
+                print("Routing again ", rows.size, " moves of the checkpoint that failed with transient errors.")
+                results.update(rows, client.route_all([origins[i] for i in rows], [dests[i] for i in rows]))
+                results.save_batch(batch_fn, start, stop)
+        else:
+            todo.append((start, batch_fn))
+
+    n_todo = sum(min(batch_size, n - start) for start, _ in todo)
+    if n_todo < n:
+        print("Resuming from checkpoint: ", n - n_todo, " of ", n, " moves already routed.")
+
+    done = 0
+    t0 = time.perf_counter()
+    for start, batch_fn in todo:
+        stop = min(start + batch_size, n)
+        results.add(start, client.route_all(origins[start:stop], dests[start:stop]))
+        if batch_fn is not None:
+            results.save_batch(batch_fn, start, stop)
+
+        done += stop - start
+        rate = done / (time.perf_counter() - t0)
+        eta = (n_todo - done) / rate
+        print(f"Routed {n - n_todo + done}/{n} moves ({100 * (n - n_todo + done) / n:.1f} %), "
+              f"{rate:.1f} moves/s, ETA {int(eta // 60)}:{int(eta % 60):02d}")
 
+    return results
+
+
+def get_the_distance(df, url=None, client=None, results=None, tolerance=None):
+    """ Query graphhopper for every move in df.
+
+    :param df: moves with origin_lat, origin_long, dest_lat, dest_long columns
+    :param url: graphhopper /route endpoint, used if no client is given
+    :param client: RoutingClient shared between calls
+    :param results: already routed RouteResults in the order of df, see
+        plan_routes and RouteResults.take
+    :param tolerance: simplification tolerance of the travel points [m]
+    :return: distances, failed rows, frame of road-class distances, travel
+        distances, times and points (arrays of [lon, lat, elevation]) aligned
+        with df
+    """
+    if results is None:
+        # Query graphhopper, results come back in the order of df. A client
+        # created here is closed again.
+        if client is None:
+            with RoutingClient(url) as own_client:
+                results = route_in_batches(own_client, *move_points(df), tolerance=tolerance)
         else:
-            print('Location data in row are invalid.')
-            dist.append(np.nan)
-            dist_failed = pd.concat([dist_failed, row.to_frame()], ignore_index=True, axis=1)
-            dist2.at[i, "travel_distances"] = np.nan
-            dist2.at[i, "travel_time"] = np.nan
-            dist2.at[i, "motorway"] = np.nan
-            dist_points.at[i, "travel_points"] = []
-    return dist, dist_failed.T, pd.concat([dist2, dist_points], axis=1)
+            results = route_in_batches(client, *move_points(df), tolerance=tolerance)
+
+    for i in df.index[results.failed]:
+        print('Location data in row ', str(i), ' are invalid.')
+
+    dist_failed = df.loc[results.failed].reset_index(drop=True)
+    return list(results.distance), dist_failed, results.to_frame(df.index)
+
+
+def route_partitions(client, partitions, tolerance=None, batch_size=500, checkpoint=None, symmetric=False,
+                     geometries=None, incomplete=None):
+    """ Distances of the moves of several partitions, routed together.
+
+    :param client: RoutingClient
+    :param partitions: dict key -> tuple of frames of moves, here the moves of
+        a year with the 5 km and the 0 km cutoff
+    :param geometries: prefix of the geometry stores, written per frame and
+        partition to <geometries>_5/<key> and <geometries>_0/<key>
+    :param incomplete: set, receives the keys of partitions with moves that
+        failed transiently
+    :return: dict key -> tuple of frames of get_the_distance without
+        travel_points, with a fresh index
+    """
+    keys = list(partitions)
+    frames = [df for key in keys for df in partitions[key]]
+
+    # The 5 km sheet is mostly a subset of the 0 km one, route every pair once.
+    plan_origins, plan_dests, plan_rows = plan_routes(frames, symmetric=symmetric)
+    n_moves = sum(df.shape[0] for df in frames)
+    print("Moves: ", n_moves, " unique routes: ", len(plan_origins),
+          " deduplication ratio: ", np.round(n_moves / max(len(plan_origins), 1), 2))
+
+    # Completed batches survive a crash; a rerun continues where it stopped.
+    routed = route_in_batches(
+        client, plan_origins, plan_dests, tolerance=tolerance, batch_size=batch_size, checkpoint=checkpoint)
 
+    distances = {}
+    rows = iter(plan_rows)
+    for key in keys:
+        distances[key] = []
+        for df, suffix in zip(partitions[key], ['_5', '_0']):
+            results = routed.take(*next(rows))
+            if incomplete is not None and results.transient.any():
+                incomplete.add(key)
+            _, _, frame = get_the_distance(df, results=results)
+            points = frame.pop("travel_points")
+            if geometries:
+                write_geometries(os.path.join(geometries + suffix, key), df.uuid, points)
+            distances[key].append(frame.reset_index(drop=True))
+        distances[key] = tuple(distances[key])
+    return distances
 
 
 if __name__ == "__main__":
@@ -103,24 +427,61 @@ if __name__ == "__main__":
     with open("config.yaml") as f:
         CONFIG = yaml.load(f, Loader=yaml.FullLoader)
   
-    origins = CONFIG['migrations_processed']
+    store = open_store(CONFIG)
     
-    df_migrations = pd.read_excel(origins, sheet_name='CBZ back migrations appended_5')
-    df_migrations_0 = pd.read_excel(origins, sheet_name='CBZ back migrations appended_0')
+    df_migrations = store.read('CBZ back migrations appended_5')
+    df_migrations_0 = store.read('CBZ back migrations appended_0')
+
+    # Routes are reused between runs unless the profile or custom model changed.
+    profile = profile_fingerprint(
+        route_parameters(None, None, CONFIG.get('hopper_points_encoded', False)), CONFIG.get('custom_model'))
+    cache = None
+    if CONFIG.get('route_cache'):
+        cache = RouteCache(CONFIG['route_cache'], profile, max_entries=CONFIG.get('route_cache_max_entries', 500000))
+
+    client = RoutingClient(
+        CONFIG['hopper_url'], workers=CONFIG.get('hopper_workers', 8), cache=cache,
+        points_encoded=CONFIG.get('hopper_points_encoded', False),
+        timeout=CONFIG.get('hopper_timeout', (5, 60)), retries=CONFIG.get('hopper_retries', 3))
+
+    # Years whose moves did not change keep their distances from the previous run.
+    years = sorted(set(df_migrations.year) | set(df_migrations_0.year))
+    partitions = {
+        str(y): (df_migrations.loc[df_migrations.year == y], df_migrations_0.loc[df_migrations_0.year == y])
+        for y in years}
+    incomplete = set()
+    route = partial(
+        route_partitions, client, tolerance=CONFIG.get('route_geometry_tolerance'),
+        batch_size=CONFIG.get('routing_batch_size', 500), checkpoint=CONFIG.get('routing_checkpoint'),
+        symmetric=CONFIG.get('route_symmetric', False), geometries=CONFIG['route_geometries'],
+        incomplete=incomplete)
+    settings = [profile, CONFIG.get('route_geometry_tolerance'), CONFIG.get('route_symmetric', False),
+                code_fingerprint(__file__)]
+    # Years with transient failures are not stored, the next run routes them again.
+    distances = run_partitions(partition_store(CONFIG, "preprocessing_2"), partitions, route, settings,
+                               complete=lambda key, _: key not in incomplete)
 
     # Append kilometers to 5 km.
-    distances, distances_failed, distance_2 = get_the_distance(df_migrations, CONFIG['hopper_url'])
+    distance_2 = pd.concat([distances[k][0].set_axis(partitions[k][0].index) for k in partitions])
+    distances_failed = df_migrations.loc[distance_2.travel_distances.isna().reindex(df_migrations.index)].reset_index(drop=True)
     df_migrations = pd.concat([df_migrations, distance_2], axis=1)
 
-
     # Append kilometers to 0 km.
-    distances_0, distances_failed_0, distance_2_0 = get_the_distance(df_migrations_0, CONFIG['hopper_url'])
+    distance_2_0 = pd.concat([distances[k][1].set_axis(partitions[k][1].index) for k in partitions])
     df_migrations_0 = pd.concat([df_migrations_0, distance_2_0], axis=1)
 
-    writer = pd.ExcelWriter(origins, engine='openpyxl', mode='a', if_sheet_exists='replace')
-    df_migrations.to_excel(writer, sheet_name="migrations distances_5 cutoff", index=False)
-    df_migrations_0.to_excel(writer, sheet_name="migrations distances_0 cutoff", index=False)
-    distances_failed.to_excel(writer, sheet_name='Failed_5', index=False)
-    writer.close()
+    print("Routing: ", client.stats())
+    if cache is not None:
+        print("Route cache: ", cache.stats())
+    client.close()
+
+    store.write({
+        "migrations distances_5 cutoff": df_migrations,
+        "migrations distances_0 cutoff": df_migrations_0,
+        "Failed_5": distances_failed})
+
+    # Everything is written, the checkpoint is no longer needed.
+    if CONFIG.get('routing_checkpoint') and os.path.exists(CONFIG['routing_checkpoint']):
+        shutil.rmtree(CONFIG['routing_checkpoint'])
 
 
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of graphhopper responses.
+
+Responses are stored in a SQLite file, keyed by the rounded origin and
+destination coordinates together with the remaining query parameters. The
+cache is tagged with a fingerprint of the routing profile (query parameters
+and the custom model file); when the fingerprint changes, all stored routes
+are dropped. The number of stored routes is bounded, the least recently used
+routes are evicted first.
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import hashlib
+import json
+import sqlite3
+import threading
+import zlib
+
+
+def profile_fingerprint(parameters, custom_model=None):
+    """ Hash of everything that changes the routes apart from the coordinates.
+
+    :param parameters: graphhopper query parameters
+    :param custom_model: path to the custom model used by the profile
+    :return: hex digest
+    """
+    h = hashlib.sha1()
+    h.update(json.dumps({k: v for k, v in parameters.items() if k != "point"}, sort_keys=True).encode())
+    if custom_model is not None:
+        with open(custom_model, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class RouteCache:
+    """ SQLite backed route cache.
+
+    :param path: cache file, ":memory:" for a throwaway cache
+    :param fingerprint: profile fingerprint, see profile_fingerprint
+    :param max_entries: number of routes kept before the oldest are evicted
+    :param precision: number of decimals kept from the coordinates in the key
+    """
+
+    def __init__(self, path, fingerprint="", max_entries=500000, precision=5):
+        self.path = path
+        self.max_entries = max_entries
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS routes ("
+            "key TEXT PRIMARY KEY, response BLOB NOT NULL, used INTEGER NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS routes_used ON routes (used)")
+
+        # Invalidate on profile / custom model change.
+        stored = self._db.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if stored is None or stored[0] != fingerprint:
+            self._db.execute("DELETE FROM routes")
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+        self._db.commit()
+
+        self._size = self._db.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+        self._clock = self._db.execute("SELECT COALESCE(MAX(used), 0) FROM routes").fetchone()[0]
+
+    def key(self, origin, dest, parameters):
+        """ Cache key of a single move.
+
+        :param origin: "lat,long" string
+        :param dest: "lat,long" string
+        :param parameters: graphhopper query parameters
+        """
+        points = [round(float(c), self.precision) for p in (origin, dest) for c in p.split(",")]
+        rest = {k: v for k, v in parameters.items() if k != "point"}
+        return hashlib.sha1(json.dumps([points, rest], sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        """ Return the cached response or None. """
+        with self._lock:
+            row = self._db.execute("SELECT response FROM routes WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._clock += 1
+            self._db.execute("UPDATE routes SET used = ? WHERE key = ?", (self._clock, key))
+            self._tick()
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key, response):
+        """ Store a response, evicting the least recently used routes if full. """
+        blob = zlib.compress(json.dumps(response, separators=(",", ":")).encode())
+        with self._lock:
+            self._clock += 1
+            known = self._db.execute("SELECT 1 FROM routes WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO routes VALUES (?, ?, ?)", (key, blob, self._clock))
+            if known is None:
+                self._size += 1
+            if self._size > self.max_entries:
+                excess = self._size - self.max_entries
+                self._db.execute(
+                    "DELETE FROM routes WHERE key IN (SELECT key FROM routes ORDER BY used LIMIT ?)", (excess,))
+                self._size -= excess
+                self.evictions += excess
+            self._tick()
+
+    def _tick(self):
+        """ Commit every few hundred writes; readers see them after commit. """
+        self._pending += 1
+        if self._pending >= 200:
+            self._db.commit()
+            self._pending = 0
+
+    def __len__(self):
+        return self._size
+
+    def stats(self):
+        """ Hit / miss counters as a dict. """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "size": self._size}
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Storage of route geometries.
+
+Routes are simplified with the Ramer-Douglas-Peucker algorithm and kept in a
+directory of flat numpy arrays:
+
+    coordinates.npy  all [lon, lat, elevation] points, route after route
+    offsets.npy      start of every route in coordinates, plus the total length
+    uuids.npy        move uuid of every route
+
+The arrays are opened memory-mapped, so single routes can be read without
+loading the whole store.
+
+Also holds the codec of graphhopper's encoded polylines (points_encoded=true):
+the google polyline format of lat/lon deltas scaled by 1e5, followed by the
+elevation delta scaled by 100 when elevation is requested.
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import os
+
+import numpy as np
+
+EARTH_RADIUS = 6371000.0  # m
+
+
+def decode_polyline(encoded, elevation=True, multiplier=1e5):
+    """ Decode a graphhopper encoded polyline.
+
+    All characters are decoded at once: 5-bit chunks are shifted into place
+    and summed per number, zigzag decoded and accumulated.
+
+    :param encoded: encoded polyline string
+    :param elevation: whether every point carries an elevation
+    :param multiplier: lat/lon scale, points_encoded_multiplier of the response
+    :return: (n, 3) array of [lon, lat, elevation] or (n, 2) of [lon, lat]
+    """
+    dims = 3 if elevation else 2
+    chunks = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if chunks.size == 0:
+        return np.zeros((0, dims))
+
+    # Every number ends with a chunk without the continuation bit.
+    last = (chunks & 0x20) == 0
+    number = np.concatenate([[0], np.cumsum(last)[:-1]])
+    starts = np.flatnonzero(np.concatenate([[True], last[:-1]]))
+    shift = 5 * (np.arange(chunks.size) - starts[number])
+    values = np.add.reduceat((chunks & 0x1f) << shift, starts)
+    values = (values >> 1) ^ -(values & 1)
+
+    deltas = values.reshape(-1, dims)
+    points = np.cumsum(deltas, axis=0).astype(np.float64)
+    points[:, :2] /= multiplier
+    if elevation:
+        points[:, 2] /= 100
+    points[:, [0, 1]] = points[:, [1, 0]]
+    return points
+
+
+def encode_polyline(coordinates, elevation=True, multiplier=1e5):
+    """ Encode [lon, lat, (elevation)] points the way graphhopper does. """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    if coordinates.size == 0:
+        return ""
+
+    columns = [coordinates[:, 1] * multiplier, coordinates[:, 0] * multiplier]
+    if elevation:
+        columns.append(coordinates[:, 2] * 100)
+    scaled = np.round(np.column_stack(columns)).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=0).ravel()
+
+    out = []
+    for value in ((deltas << 1) ^ (deltas >> 63)).tolist():
+        while value >= 0x20:
+            out.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        out.append(chr(value + 63))
+    return "".join(out)
+
+
+def path_coordinates(path):
+    """ [lon, lat, elevation] points of a graphhopper path, encoded or not. """
+    points = path['points']
+    if isinstance(points, str):
+        return decode_polyline(points, multiplier=path.get('points_encoded_multiplier', 1e5))
+    return np.asarray(points['coordinates'], dtype=np.float64)
+
+
+def rdp(coordinates, tolerance):
+    """ Ramer-Douglas-Peucker simplification of a [lon, lat, (elevation)] line.
+
+    Distances are measured in meters on a local equirectangular projection;
+    elevation is carried along but does not influence the simplification.
+
+    :param coordinates: (n, 2 or 3) array-like of points
+    :param tolerance: maximal distance of a dropped point from the simplified
+        line [m]. None or 0 keeps every point.
+    :return: array of the kept points
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    n = coordinates.shape[0]
+    if not tolerance or n < 3:
+        return coordinates
+
+    # Project to meters around the mean latitude.
+    lat0 = np.deg2rad(coordinates[:, 1].mean())
+    xy = np.deg2rad(coordinates[:, :2]) * EARTH_RADIUS
+    xy[:, 0] *= np.cos(lat0)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        chord = xy[last] - xy[first]
+        rel = xy[first + 1:last] - xy[first]
+        length = np.hypot(*chord)
+        if length > 0:
+            dist = np.abs(chord[0] * rel[:, 1] - chord[1] * rel[:, 0]) / length
+        else:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            split = first + 1 + k
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return coordinates[keep]
+
+
+def write_geometries(path, uuids, geometries):
+    """ Write routes to a geometry store.
+
+    :param path: store directory, created if missing
+    :param uuids: move uuid of every route
+    :param geometries: list of (n_i, 3) arrays, empty for failed routes
+    """
+    os.makedirs(path, exist_ok=True)
+
+    lengths = np.array([len(g) for g in geometries], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    coordinates = np.zeros((offsets[-1], 3), dtype=np.float64)
+    for start, stop, g in zip(offsets[:-1], offsets[1:], geometries):
+        if stop > start:
+            coordinates[start:stop, :np.shape(g)[1]] = g
+
+    np.save(os.path.join(path, "coordinates.npy"), coordinates)
+    np.save(os.path.join(path, "offsets.npy"), offsets)
+    np.save(os.path.join(path, "uuids.npy"), np.asarray(uuids, dtype=str))
+
+
+class GeometryStore:
+    """ Memory-mapped reader of a geometry store written by write_geometries.
+
+    :param path: store directory
+    """
+
+    def __init__(self, path):
+        self.coordinates = np.load(os.path.join(path, "coordinates.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.uuids = np.load(os.path.join(path, "uuids.npy"), mmap_mode="r")
+        self._index = {u: i for i, u in enumerate(self.uuids.tolist())}
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, uuid):
+        return uuid in self._index
+
+    def __getitem__(self, uuid):
+        """ [lon, lat, elevation] points of the route of a move. """
+        i = self._index[uuid]
+        return self.coordinates[self.offsets[i]:self.offsets[i + 1]]
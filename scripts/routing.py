@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Client for the graphhopper routing engine.
+
+Routes are queried over a single keep-alive session whose connection pool is
+shared by a bounded number of worker threads. Responses are returned in the
+same order as the queried moves, so callers can treat the client as a drop-in
+replacement for a sequential loop of requests.get calls. An optional
+RouteCache (see route_cache.py) answers moves that were routed before.
+Transient errors are retried and the concurrency adapts to the server.
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def route_parameters(origin, dest, points_encoded=False):
+    """ Graphhopper GET parameters for a single move.
+
+    :param origin: "lat,long" string of the move origin
+    :param dest: "lat,long" string of the move destination
+    :param points_encoded: ask for an encoded polyline instead of a json array
+        of points, see route_geometry.decode_polyline
+    :return: dict of query parameters
+    """
+    return {
+        "profile": "truck2",  # TODO. change this to beekeeper truck.
+        "point": [origin, dest],
+        "elevation": "true",
+        "details": ["road_class", "distance"],
+        "optimize": "true",
+        "distance_influence": 0,
+        "points_encoded": "true" if points_encoded else "false",  # if false, you get [lon, lat, elevation] form
+        "debug": "false",
+        "calc_points": "true",
+        "ch.disable": "false",
+        "pass_through": "false"}
+
+
+class AdaptiveLimit:
+    """ AIMD limit on the number of requests in flight.
+
+    The limit grows by about one request per round of successful requests
+    (additive increase) and is halved on transient errors or when the latency
+    rises well above the best latency seen so far (multiplicative decrease),
+    at most once per round.
+
+    :param maximum: upper bound of the limit
+    :param initial: starting limit
+    :param latency_factor: latency / best latency ratio treated as overload
+    """
+
+    def __init__(self, maximum, initial=None, latency_factor=3.0):
+        self.maximum = maximum
+        self.limit = float(initial or max(1, maximum // 2))
+        self.latency_factor = latency_factor
+        self.inflight = 0
+        self.latency = None  # EWMA of successful request latencies [s].
+        self.best_latency = None
+        self._since_decrease = 0
+        self.lock = threading.Lock()  # Also guards counters of the client, see RoutingClient._count.
+        self._condition = threading.Condition(self.lock)
+
+    def acquire(self):
+        with self._condition:
+            while self.inflight >= int(self.limit):
+                self._condition.wait()
+            self.inflight += 1
+
+    def release(self, latency=None, overloaded=False):
+        """ Record the outcome of a request and free its slot.
+
+        :param latency: duration of a successful request [s]
+        :param overloaded: the request failed with a transient error
+        """
+        with self._condition:
+            self.inflight -= 1
+            self._since_decrease += 1
+
+            if latency is not None:
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                self.best_latency = min(self.best_latency or latency, self.latency)
+                overloaded = overloaded or self.latency > self.latency_factor * self.best_latency
+
+            if overloaded:
+                if self._since_decrease >= self.limit:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._since_decrease = 0
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class TransientError(Exception):
+    """ Routing failed for a reason that may go away on retry. """
+
+
+class RoutingClient:
+    """ Pooled, concurrent graphhopper client.
+
+    Requests time out and are retried with exponential backoff on transient
+    errors (connection problems, timeouts, HTTP 429 / 5xx, malformed
+    responses). Answers of graphhopper itself, e.g. "Connection between
+    locations not found", are returned as they are. Moves that still fail are
+    retried once more in a batched pass at the end of route_all. The number
+    of requests in flight adapts to the server, see AdaptiveLimit.
+
+    :param url: graphhopper /route endpoint
+    :param workers: maximal number of requests in flight at the same time
+    :param cache: RouteCache consulted before querying graphhopper
+    :param points_encoded: request encoded polylines, which are several times
+        smaller and faster to parse than json arrays of points
+    :param timeout: (connect, read) timeout of a request [s]
+    :param retries: retries of a request before it is left to the retry pass
+    :param backoff: first backoff delay [s], doubled on every retry
+    :param retry_passes: batched retry passes over the moves that failed
+    """
+
+    def __init__(self, url, workers=8, cache=None, points_encoded=False,
+                 timeout=(5, 60), retries=3, backoff=0.5, retry_passes=1):
+        self.url = url
+        self.workers = max(1, int(workers))
+        self.cache = cache
+        self.points_encoded = points_encoded
+        self.timeout = tuple(timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_passes = retry_passes
+        self.limit = AdaptiveLimit(self.workers)
+        self.n_requests = 0
+        self.n_retries = 0
+        self.n_transient_failures = 0
+
+        # One connection per worker, kept alive between requests.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _get(self, parameters):
+        """ One request; raises TransientError if it is worth retrying. """
+        self.limit.acquire()
+        start = time.perf_counter()
+        latency = None
+        try:
+            response = self.session.get(self.url, params=parameters, timeout=self.timeout)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise TransientError(f"HTTP {response.status_code}")
+            data = response.json()
+            if 'paths' not in data and 'message' not in data:
+                raise TransientError(f"HTTP {response.status_code}, unexpected response")
+            latency = time.perf_counter() - start
+        except (requests.RequestException, ValueError, TransientError) as error:
+            # Any requests error, e.g. a response cut short, may go away on retry.
+            raise TransientError(str(error)) from error
+        finally:
+            # Free the slot whatever happened, leaked slots stall the limit.
+            self.limit.release(latency=latency, overloaded=latency is None)
+        return data
+
+    def _count(self, sent=0, retried=0, failed=0):
+        """ Update the request, retry and transient failure counters, which
+        pool threads share. """
+        with self.limit.lock:
+            self.n_requests += sent
+            self.n_retries += retried
+            self.n_transient_failures += failed
+
+    def route(self, origin, dest):
+        """ Query a single move and return the parsed json response. Transient
+        failures return {"message": ..., "transient": True}. """
+        parameters = route_parameters(origin, dest, self.points_encoded)
+
+        if self.cache is not None:
+            key = self.cache.key(origin, dest, parameters)
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+
+        for attempt in range(self.retries + 1):
+            self._count(sent=1)
+            try:
+                data = self._get(parameters)
+                break
+            except TransientError as error:
+                data = {"message": str(error), "transient": True}
+                if attempt < self.retries:
+                    self._count(retried=1)
+                    time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+        # Only found routes are cached, failures are retried on the next run.
+        if self.cache is not None and 'paths' in data:
+            self.cache.put(key, data)
+        return data
+
+    def _route_many(self, origins, dests):
+        if self.workers == 1:
+            return [self.route(o, d) for o, d in zip(origins, dests)]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(self.route, origins, dests))
+
+    def route_all(self, origins, dests):
+        """ Query all moves, adapting the number of requests in flight.
+
+        :param origins: sequence of "lat,long" origin strings
+        :param dests: sequence of "lat,long" destination strings
+        :return: list of parsed responses, in the order of the moves
+        """
+        responses = self._route_many(origins, dests)
+
+        for retry_pass in range(self.retry_passes):
+            failed = [i for i, data in enumerate(responses) if data.get("transient")]
+            if not failed:
+                break
+            print("Retrying ", len(failed), " moves that failed with transient errors.")
+            time.sleep(self.backoff * 2 ** (self.retries + retry_pass))
+            retried = self._route_many([origins[i] for i in failed], [dests[i] for i in failed])
+            for i, data in zip(failed, retried):
+                responses[i] = data
+
+        self._count(failed=sum(1 for data in responses if data.get("transient")))
+        return responses
+
+    def stats(self):
+        """ Request counters and the current concurrency limit as a dict. """
+        return {
+            "requests": self.n_requests,
+            "retries": self.n_retries,
+            "transient_failures": self.n_transient_failures,
+            "concurrency": int(self.limit.limit),
+            "latency": self.limit.latency}
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Storage of the intermediate tables exchanged between pipeline stages.
+
+Stages read and write tables by name (the former sheet names of
+migrations_processed.xlsx) through a store:
+
+    ColumnarStore  one Parquet or Feather file per table in a directory.
+                   Column types are kept as they are, reads can select
+                   columns and are memory-mapped.
+    ExcelStore     one sheet per table in a workbook, as before.
+
+open_store picks the store from config.yaml. Tables that are not in a
+columnar store yet, e.g. the raw 'migrations pruned' sheet, are read from the
+migrations_processed workbook. Final deliverables (Migration_Stats.xlsx,
+migrations_travel_costs.xlsx) are still written to Excel by their stages.
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import os
+
+import pandas as pd
+
+
+def arrow_safe(df):
+    """ Frame that pyarrow can store: object columns holding anything but
+    strings (e.g. uncertainties' ufloats or mixed types) are converted to
+    strings, as Excel would. Missing values stay missing. """
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for column in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[column], skipna=True) not in ("string", "empty"):
+            df[column] = df[column].map(lambda v: v if v is None or v is pd.NA or (isinstance(v, float) and v != v) else str(v))
+    return df
+
+
+def as_stored(df, index=False):
+    """ df as a columnar store keeps it, see ColumnarStore.write. """
+    return arrow_safe(df.reset_index() if index else df.reset_index(drop=True))
+
+
+class ExcelStore:
+    """ Tables as sheets of a single workbook.
+
+    :param path: workbook file
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __contains__(self, name):
+        return os.path.exists(self.path) and name in pd.ExcelFile(self.path).sheet_names
+
+    def location(self, name):
+        """ File holding table name. """
+        return self.path
+
+    def read(self, name, columns=None):
+        """ Table name, optionally only some columns. """
+        return pd.read_excel(self.path, sheet_name=name, usecols=columns)
+
+    def write(self, tables, index=False):
+        """ Write tables (dict name -> frame), replacing tables of the same name. """
+        if os.path.exists(self.path):
+            writer = pd.ExcelWriter(self.path, engine='openpyxl', mode='a', if_sheet_exists='replace')
+        else:
+            writer = pd.ExcelWriter(self.path, engine='openpyxl')
+        with writer:
+            for name, df in tables.items():
+                df.to_excel(writer, sheet_name=name, index=index)
+
+
+class ColumnarStore:
+    """ Tables as Parquet or Feather files in a directory.
+
+    :param path: store directory, created if missing
+    :param format: "parquet" or "feather"
+    :param fallback: store read from if a table is missing, e.g. the
+        ExcelStore of the raw data
+    """
+
+    def __init__(self, path, format="parquet", fallback=None):
+        if format not in ("parquet", "feather"):
+            raise ValueError("Unknown table format: " + str(format))
+        self.path = path
+        self.format = format
+        self.fallback = fallback
+        os.makedirs(path, exist_ok=True)
+
+    def _fn(self, name):
+        return os.path.join(self.path, name + "." + self.format)
+
+    def __contains__(self, name):
+        return os.path.exists(self._fn(name)) or (self.fallback is not None and name in self.fallback)
+
+    def location(self, name):
+        """ File holding table name. """
+        if not os.path.exists(self._fn(name)) and self.fallback is not None:
+            return self.fallback.location(name)
+        return self._fn(name)
+
+    def read(self, name, columns=None):
+        """ Table name, optionally only some columns. """
+        if not os.path.exists(self._fn(name)):
+            if self.fallback is None:
+                raise KeyError(name)
+            return self.fallback.read(name, columns)
+
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            table = pq.read_table(self._fn(name), columns=columns, memory_map=True)
+        else:
+            import pyarrow.feather as feather
+            table = feather.read_table(self._fn(name), columns=columns, memory_map=True)
+        return table.to_pandas()
+
+    def write(self, tables, index=False):
+        """ Write tables (dict name -> frame), replacing tables of the same name.
+
+        :param index: keep the index as column(s), as ExcelStore does
+        """
+        for name, df in tables.items():
+            df = as_stored(df, index)
+            # Replace atomically, readers never see a partial file.
+            tmp = self._fn(name) + ".tmp"
+            if self.format == "parquet":
+                df.to_parquet(tmp, engine="pyarrow", index=False)
+            else:
+                df.to_feather(tmp)
+            os.replace(tmp, self._fn(name))
+
+
+class MemoryStore:
+    """ Keeps the tables written or read through it in memory and writes
+    through to store, so stages run in one process (see pipeline.py) pass
+    frames without reading them back from disk.
+
+    :param store: ColumnarStore or ExcelStore
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.tables = {}
+
+    def __contains__(self, name):
+        return name in self.tables or name in self.store
+
+    def location(self, name):
+        return self.store.location(name)
+
+    def read(self, name, columns=None):
+        """ Copy of table name, optionally only some columns. """
+        if name not in self.tables:
+            self.tables[name] = self.store.read(name)
+        df = self.tables[name]
+        return (df if columns is None else df[columns]).copy()
+
+    def write(self, tables, index=False):
+        self.store.write(tables, index)
+        for name, df in tables.items():
+            self.tables[name] = as_stored(df, index)
+
+
+""" store returned by open_store, set by share_store """
+_shared = None
+
+
+def share_store(store):
+    """ Make open_store return store, None restores the default. """
+    global _shared
+    _shared = store
+
+
+def open_store(config):
+    """ Store of intermediate tables selected by config['intermediate_format']:
+    "parquet" or "feather" under config['intermediates'], or "excel" for the
+    sheets of config['migrations_processed']. Within a pipeline run, the
+    shared MemoryStore, see share_store. """
+    if _shared is not None:
+        return _shared
+    workbook = ExcelStore(config['migrations_processed'])
+    format = config.get('intermediate_format', 'excel')
+    if format == 'excel':
+        return workbook
+    return ColumnarStore(config['intermediates'], format, fallback=workbook)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Lookup of time-varying tariffs (fuel prices, toll) by date of move.
+
+A tariff table holds values valid from start_date to end_date, both
+inclusive. Every table is sorted once and the moves are matched to it by
+binary search, so the cost grows with (moves + periods) * log(periods)
+instead of moves * periods. Moves that fall into no period (gaps) or into
+several periods (overlaps) are flagged; in overlaps the period listed last in
+the table wins, as with the former loop over the table rows.
+"""
+__author__ = "janez presern, anja pavlin, andraz marinc"
+
+
+import numpy as np
+import pandas as pd
+
+
+class Tariff:
+    """ A tariff table.
+
+    :param name: tariff name, used for the flag columns
+    :param table: frame with one row per period
+    :param columns: dict column of table -> column of the result
+    :param start: column of the first day of a period
+    :param end: column of the last day of a period
+    """
+
+    def __init__(self, name, table, columns, start="start_date", end="end_date"):
+        self.name = name
+        self.columns = dict(columns)
+
+        table = table.loc[table[start].notna() & table[end].notna()]
+        self.starts = pd.to_datetime(table[start]).values.astype("datetime64[ns]")
+        self.ends = pd.to_datetime(table[end]).values.astype("datetime64[ns]")
+        self.values = {column: table[column].values for column in self.columns}
+
+        self._by_start = np.argsort(self.starts, kind="stable")
+        self._sorted_starts = self.starts[self._by_start]
+        self._sorted_ends = np.sort(self.ends)
+
+    def periods(self, dates):
+        """ Row position of the period of every date, -1 if there is none,
+        and the number of periods covering every date. """
+        dates = np.asarray(dates, dtype="datetime64[ns]")
+        started = np.searchsorted(self._sorted_starts, dates, side="right")
+        ended = np.searchsorted(self._sorted_ends, dates, side="left")
+        covering = started - ended
+        covering[np.isnat(dates)] = 0
+
+        # The period starting last before the date, if it still lasts, is the
+        # only candidate when a single period covers the date.
+        position = np.full(dates.shape, -1, dtype=np.int64)
+        last = self._by_start[np.maximum(started - 1, 0)] if len(self.starts) else position
+        single = (covering == 1) & (started > 0)
+        single &= self.ends[last] >= dates if len(self.starts) else False
+        position[single] = last[single]
+
+        # Overlaps and periods hidden behind a later, shorter one: pick the
+        # covering period listed last in the table.
+        for i in np.flatnonzero((covering > 0) & ~single):
+            inside = np.flatnonzero((self.starts <= dates[i]) & (self.ends >= dates[i]))
+            position[i] = inside[-1]
+        return position, covering
+
+
+def lookup_tariffs(dates, tariffs, applies=None):
+    """ Tariff values at the dates of moves.
+
+    :param dates: dates of the moves
+    :param tariffs: list of Tariff
+    :param applies: dict tariff name -> boolean mask of the moves the tariff
+        applies to, e.g. toll only for trucks; other moves get NaN and no flags
+    :return: frame aligned with dates, with the columns of all tariffs and
+        boolean columns "<name> gap" and "<name> overlap"
+    """
+    index = dates.index if isinstance(dates, pd.Series) else None
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    applies = applies or {}
+
+    result = {}
+    for tariff in tariffs:
+        position, covering = tariff.periods(dates)
+        mask = np.asarray(applies.get(tariff.name, np.ones(dates.shape, dtype=bool)), dtype=bool)
+        found = (position >= 0) & mask
+
+        for column, target in tariff.columns.items():
+            values = np.full(dates.shape, np.nan, dtype=np.result_type(tariff.values[column].dtype, np.float64))
+            values[found] = tariff.values[column][position[found]]
+            result[target] = values
+        result[tariff.name + " gap"] = (covering == 0) & mask
+        result[tariff.name + " overlap"] = (covering > 1) & mask
+
+    return pd.DataFrame(result, index=index)
@@ -0,0 +1,37 @@
+""" Tests of the cache of fitted models in fuel_models.py. """
+
+import numpy as np
+
+from fuel_models import FitModel, fit_models
+
+
+def linear(x, k, intercept):
+    return k * x + intercept
+
+
+def quadratic(x, k, intercept):
+    return k * x ** 2 + intercept
+
+
+def test_fit_models_changed_function_misses_cache(tmp_path):
+    """ Same name, parameters and bounds, another function, e.g. after an edit of utils.py. """
+    x = np.arange(1.0, 21.0)
+    y = 0.01 * x ** 2 + 0.3
+    bounds = ([0, 0], [5, 100])
+
+    first, _ = fit_models(x, y, [FitModel("model", linear, ["k", "intercept"], bounds)], cache=str(tmp_path))
+    second, _ = fit_models(x, y, [FitModel("model", quadratic, ["k", "intercept"], bounds)], cache=str(tmp_path))
+
+    np.testing.assert_allclose(second["model"]["popt"], [0.01, 0.3], rtol=1e-6)
+    assert not np.allclose(first["model"]["popt"], second["model"]["popt"])
+
+
+def test_fit_models_same_function_hits_cache(tmp_path, capsys):
+    x = np.arange(1.0, 21.0)
+    y = 0.2 * x + 1
+    models = [FitModel("model", linear, ["k", "intercept"], ([0, 0], [5, 100]))]
+
+    fit_models(x, y, models, cache=str(tmp_path))
+    fit_models(x, y, models, cache=str(tmp_path))
+
+    assert "fitted:  0 " in capsys.readouterr().out.splitlines()[-1]
@@ -0,0 +1,21 @@
+""" Tests of the parsing of graphhopper responses in preprocessing_2.py. """
+
+import numpy as np
+
+from preprocessing_2 import distance_by_roadclass
+
+
+def test_distance_by_roadclass_all_failed():
+    """ A batch in which every request failed, e.g. during an outage. """
+    assert distance_by_roadclass([{'message': 'Connection refused'}] * 3) == {}
+
+
+def test_distance_by_roadclass_failed_rows_are_nan():
+    route = {'paths': [{'details': {
+        'road_class': [[0, 2, 'motorway'], [2, 4, 'primary']],
+        'distance': [[0, 1, 100.0], [1, 2, 50.0], [2, 4, 30.0]]}}]}
+    distances = distance_by_roadclass([{'message': 'x'}, route])
+
+    assert distances['motorway'].dtype == float
+    assert np.isnan(distances['motorway'][0]) and distances['motorway'][1] == 150.0
+    assert np.isnan(distances['primary'][0]) and distances['primary'][1] == 30.0
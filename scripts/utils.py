@@ -3,8 +3,6 @@
 __author__ = "janez presern, anja pavlin, andraz marinc"
 
 import numpy as np
-import scipy.signal as sg
-import uncertainties.unumpy as unp
 
 
 def sigmoid(x, x0, k, top=1, bottom=0):
@@ -43,6 +41,7 @@ def rise_exp2(x, k, top=1, offset=0):
 
 
 def unp_rise_exp2(x, k, top, bottom):
+    import uncertainties.unumpy as unp
 
     return top * (1 - unp.exp(-x/k)) + bottom
 
@@ -53,6 +52,7 @@ def decay_exp2(x, k, top, bottom):
 
 
 def unp_decay_exp2(x, k, top, offset):
+    import uncertainties.unumpy as unp
 
     return top * unp.exp(-k * x) + offset
 
@@ -62,6 +62,22 @@ def linear (x, k, intercept):
     return k * x + intercept
 
 
+def linear_unc(x, k, intercept, var_k, cov_k_intercept, var_intercept):
+
+    """
+    Linear with the standard deviation propagated from the covariance of the
+    fitted parameters, to first order as uncertainties does, for arrays of x
+    :param x: actual x
+    :param var_k, cov_k_intercept, var_intercept: covariance matrix of k and intercept, e.g. pcov of curve_fit
+    :return y, y_std:
+    """
+
+    x = np.asarray(x, dtype=float)
+    var = x ** 2 * var_k + 2 * x * cov_k_intercept + var_intercept
+
+    return linear(x, k, intercept), np.sqrt(np.maximum(var, 0))
+
+
 def r_square(x_fact, y_fact, p_popt, func):
 
     """
@@ -69,25 +85,42 @@ def r_square(x_fact, y_fact, p_popt, func):
     :param x_fact: actual x
     :param y_fact: actual y
     :param p_popt: fitted parameters
+    :param func: fitted function of x and the parameters
     :return r_squared:
     """
 
-    if func == rise_exp2:
+    return r_squares(y_fact, func(x_fact, *p_popt))
+
 
-        residuals = y_fact - rise_exp2(x_fact, p_popt[0], p_popt[1], p_popt[2])
+def r_squares(y_fact, y_pred):
 
-    elif func == decay_exp2:
+    """
+    Calculates R^2 of several predictions at once
+    :param y_fact: actual y
+    :param y_pred: predicted y, or an array with one prediction per row
+    :return r_squared: float, or array with one R^2 per row
+    """
 
-        residuals = y_fact - decay_exp2(x_fact, p_popt[0], p_popt[1], p_popt[2])
+    y_fact = np.asarray(y_fact, dtype=float)
+    ss_res = np.sum((y_fact - np.asarray(y_pred, dtype=float)) ** 2, axis=-1)
+    ss_tot = np.sum((y_fact - np.mean(y_fact)) ** 2)
 
-    elif func == linear:
+    return 1 - (ss_res / ss_tot)
 
-        residuals = y_fact - linear(x_fact, p_popt[0], p_popt[1])
 
-    ss_res = np.sum(residuals ** 2)
-    ss_tot = np.sum((y_fact - np.mean(y_fact)) ** 2)
-    r_squared = 1 - (ss_res / ss_tot)
+def aic(y_fact, y_pred, p):
 
-    return r_squared
+    """
+    Calculates AIC as RegscorePy does, n log(RSS / n) + 2 p, of several
+    predictions at once
+    :param y_fact: actual y
+    :param y_pred: predicted y, or an array with one prediction per row
+    :param p: number of parameters, or an array with one per row
+    :return aic_score: float, or array with one AIC per row
+    """
 
+    y_fact = np.asarray(y_fact, dtype=float)
+    n = y_fact.shape[-1]
+    rss = np.sum((np.asarray(y_pred, dtype=float) - y_fact) ** 2, axis=-1)
 
+    return n * np.log(rss / n) + 2 * np.asarray(p)